@@ -1,52 +1,105 @@
 from config import settings
 
 import json
-import requests
+import random
+import asyncio
+import aiohttp
 
 
 class MrStoneAPI:
+    """
+    Async client of the MrStone API.
+    All the instances share one session, so connections are pooled and reused between requests.
+    """
+
+    session: aiohttp.ClientSession | None = None
+
+    # Only these requests can be repeated without side effects
+    retry_methods = ('GET', 'DELETE')
+    retry_statuses = (502, 503, 504)
+    retry_base_delay = 0.2
+
     def __init__(self) -> None:
         self.url = settings.mrstone_api_url
         self.auth_token = settings.mrstone_api_auth_token
 
-    def sendRequest(self, method: str, url: str, data: dict = {}, headers: dict = {}) -> dict:
-        """Sends request to Telegram API.
+    @classmethod
+    def getSession(cls) -> aiohttp.ClientSession:
+        "Returns the shared session, it's created on the first request inside the running event loop."
+
+        if cls.session is None or cls.session.closed:
+            cls.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=settings.mrstone_api_max_connections),
+                timeout=aiohttp.ClientTimeout(total=settings.mrstone_api_timeout),
+            )
+        return cls.session
 
-        :param request_method: http request method (`get`, `post`, `patch`, `delete`).
-        :param api_method: the required method in Telegram API.
+    @classmethod
+    async def closeSession(cls) -> None:
+        if cls.session is not None and not cls.session.closed:
+            await cls.session.close()
+        cls.session = None
+
+    async def sendRequest(self, method: str, url: str, data: dict = {}, headers: dict = {}) -> dict:
+        """Sends request to MrStone API.
+        Idempotent requests are retried with exponential backoff and jitter
+        after connection errors, timeouts and gateway errors.
+
+        :param method: http request method (`get`, `post`, `patch`, `delete`).
+        :param url: endpoint url.
+        :param data: query params of `get` and `delete` requests or form data of other requests.
         """
 
-        args = (url, data)
-        kwargs = {'headers': headers}
-        match method.upper():
-            case 'GET': r = requests.get(*args, **kwargs)
-            case 'POST': r = requests.post(*args, **kwargs)
-            case 'PATCH': r = requests.patch(*args, **kwargs)
-            case 'DELETE': r = requests.delete(*args, **kwargs)
-
-        response = {
-            'code': r.status_code,
-            'text': r.text,
-        }
-        
-        return response
+        method = method.upper()
+        if method in ('GET', 'DELETE'):
+            kwargs = {'params': data, 'headers': headers}
+        else:
+            kwargs = {'data': data, 'headers': headers}
 
-    def getOrder(self, order_id: str) -> dict:
+        attempts = 1 + (settings.mrstone_api_retries if method in self.retry_methods else 0)
+        for attempt in range(attempts):
+            is_last_attempt = attempt == attempts - 1
+            try:
+                async with self.getSession().request(method, url, **kwargs) as r:
+                    if r.status not in self.retry_statuses or is_last_attempt:
+                        return {
+                            'code': r.status,
+                            'text': await r.text(),
+                        }
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if is_last_attempt:
+                    raise
+
+            # Full jitter spreads retries of many users over time instead of repeating them at once
+            await asyncio.sleep(random.uniform(0, self.retry_base_delay * 2 ** attempt))
+
+    async def getOrder(self, order_id: str) -> dict:
         endpoint_url = self.url + f'store/orders/{order_id}/'
 
-        response = self.sendRequest('get', endpoint_url)
+        response = await self.sendRequest('get', endpoint_url)
         response_data = json.loads(response['text'])
         
         order = response_data['details']['order']
         return order
 
-    def getOrdersByContact(self, contact: str, contact_type: str) -> list:
+    async def getOrdersPage(
+        self, contact: str, contact_type: str, page: int, limit: int, status_counts: bool = False
+    ) -> dict:
+        """Fetches one page of the contact orders with the number of all the orders.
+
+        :param status_counts: adds the numbers of the orders by status.
+        """
+
         endpoint_url = self.url + 'store/orders/'
-        data = {'contact': contact, 'contact_type': contact_type}
+        data = {
+            'contact': contact,
+            'contact_type': contact_type,
+            'page': page,
+            'limit': limit,
+            'status_counts': 'true' if status_counts else 'false',
+        }
 
-        response = self.sendRequest('get', endpoint_url, data)
+        response = await self.sendRequest('get', endpoint_url, data)
         response_data = json.loads(response['text'])
-        
-        orders = response_data['details']['orders']
-        return orders
 
+        return response_data['details']
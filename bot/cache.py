@@ -0,0 +1,44 @@
+from config import settings
+
+import time
+import redis.asyncio
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    In-memory cache whose values expire `ttl` seconds after they were set.
+    When the cache is full, the least recently set values are dropped.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10_000) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.values = OrderedDict()
+
+    def setValue(self, key: str, value) -> None:
+        self.values.pop(key, None)
+        self.values[key] = (time.monotonic() + self.ttl, value)
+        while len(self.values) > self.max_size:
+            self.values.popitem(last=False)
+
+    def getValue(self, key: str):
+        item = self.values.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self.values[key]
+            return None
+        return value
+
+    def deleteKey(self, key: str) -> None:
+        self.values.pop(key, None)
+
+
+# Rendered order lists of users by Telegram username, they are reused while the user switches pages
+orders_cache = TTLCache(ttl=settings.orders_cache_ttl)
+
+# Connections are opened on the first command inside the running event loop
+redis_client = redis.asyncio.Redis.from_url(settings.redis_url, decode_responses=True)
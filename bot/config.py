@@ -1,14 +1,55 @@
 from pathlib import Path
+from typing import Literal
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     # Telegram Bot
     telegram_bot_token: str
+    # Polling is meant for development, webhook workers can be scaled behind a load balancer
+    bot_mode: Literal['polling', 'webhook'] = 'polling'
+
+    # Webhook
+    webhook_base_url: str | None = None
+    webhook_path: str = '/webhook'
+    webhook_secret: str | None = None
+    webhook_host: str = '0.0.0.0'
+    webhook_port: int = 8080
+    webhook_workers: int = 1
+    # Seconds the stopping worker waits for the updates which are being handled
+    webhook_shutdown_timeout: float = 30
 
     # MrStone API
     mrstone_api_url: str
     mrstone_api_auth_token: str
+    # Seconds of the whole request, including the connection
+    mrstone_api_timeout: float = 10
+    mrstone_api_max_connections: int = 100
+    # Attempts of idempotent requests after a connection error or an unavailable server
+    mrstone_api_retries: int = 3
+
+    # Seconds the user's order list is reused while the user switches its pages
+    orders_cache_ttl: int = 120
+
+    # Redis which is shared with the MrStone API, it delivers order events
+    redis_url: str = 'redis://localhost:6379/0'
+    # Number of order events which are read and acknowledged together
+    order_events_batch_size: int = 100
+
+    # Redis keeps FSM states of users between restarts and shares them between workers
+    fsm_storage: Literal['memory', 'redis'] = 'memory'
+    # Seconds FSM states and data are kept in Redis, they are kept forever by default
+    fsm_state_ttl: int | None = None
+
+    # Repeats of the same button press by the user within this time are dropped
+    callback_throttle_ms: int = 700
+
+    @model_validator(mode='after')
+    def checkWebhook(self):
+        if self.bot_mode == 'webhook' and not self.webhook_base_url:
+            raise ValueError('Webhook mode requires the webhook base url')
+        return self
 
     class Config:
         env_file = Path(__file__).parent / '.env'
@@ -4,6 +4,7 @@ sys.path.append('../') # src/
 from exceptions import exceptions_catcher
 from utils import respondEvent, datetimeToString
 from pagination import Paginator
+from cache import orders_cache
 
 from api.mrstone import MrStoneAPI
 
@@ -13,6 +14,7 @@ from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 import dateutil
+import functools
 
 
 router = Router(name=__name__)
@@ -32,58 +34,89 @@ async def orders(event: Message | CallbackQuery) -> None:
         )
         return await respondEvent(event, text=message_text, parse_mode="Markdown")
 
-    mrstone_api = MrStoneAPI()
-    orders = mrstone_api.getOrdersByContact(contact=username, contact_type='telegram')
-    orders_count = len(orders)
+    page = 1
+    is_page_switch = isinstance(event, CallbackQuery) and '-' in event.data
+    if is_page_switch:
+        page = int(event.data.split('-')[1])
+
+    # Switching pages reuses the pages fetched since the list was opened, opening the list fetches it again
+    orders_list = orders_cache.getValue(username) if is_page_switch else None
+    if orders_list is None:
+        orders_list = {'pages': {}, 'statuses': {}, 'count': 0, 'message_text': None}
+        orders_cache.setValue(username, orders_list)
 
-    if not orders:
+    page_source = functools.partial(getOrdersPage, username, orders_list)
+    paginator = Paginator(page_source=page_source, offset=5, page_callback='orders', back_callback='start')
+    keyboard = await paginator.getPageKeyboard(page)
+
+    if not orders_list['count']:
         return await respondEvent(event, text='📂 У Вас нет ни одного заказа')
 
-    order_statuses = {
-        'created': {'title': 'Сформирован', 'count': 0},
-        'in_progress': {'title': 'В работе', 'count': 0},
-        'in_delivery': {'title': 'Доставляется', 'count': 0},
-        'completed': {'title': 'Завершён', 'count': 0},
-        'cancelled': {'title': 'Отменён', 'count': 0},
-        'rejected': {'title': 'Отклонён', 'count': 0},
-    }
-
-    orders_cards = []
-    for order in orders:
-        order_id = order['id']
-        status = order['status']
-        created_at = datetimeToString(
-            dateutil.parser.parse(order['created_at'])
-        )
+    await respondEvent(
+        event,
+        text=orders_list['message_text'], 
+        parse_mode="Markdown",
+        reply_markup=keyboard.as_markup(),
+    )
 
-        order_statuses[status]['count'] += 1
 
-        orders_cards.append(
-            {'text': f'{order_statuses[status]["title"]} | {created_at}', 'callback_data': f'order_card-{order_id}'}
+order_statuses_titles = {
+    'created': 'Сформирован',
+    'in_progress': 'В работе',
+    'in_delivery': 'Доставляется',
+    'completed': 'Завершён',
+    'cancelled': 'Отменён',
+    'rejected': 'Отклонён',
+}
+
+
+async def getOrdersPage(username: str, orders_list: dict, page: int, page_size: int) -> tuple[list, int]:
+    """Returns cards of the orders page and the number of all the user orders.
+    Pages are fetched from the API one by one and kept in the cached orders list.
+    """
+
+    if page not in orders_list['pages']:
+        mrstone_api = MrStoneAPI()
+        orders_page = await mrstone_api.getOrdersPage(
+            contact=username,
+            contact_type='telegram',
+            page=page,
+            limit=page_size,
+            status_counts=orders_list['message_text'] is None,
         )
 
-    page = 1
-    if isinstance(event, CallbackQuery):
-        if '-' in event.data:
-            page = int(event.data.split('-')[1])
-    paginator = Paginator(array=orders_cards, offset=5, page_callback='orders', back_callback='start')
-    keyboard = paginator.getPageKeyboard(page)
+        orders_cards = []
+        for order in orders_page['orders']:
+            order_id = order['id']
+            status = order['status']
+            created_at = datetimeToString(
+                dateutil.parser.parse(order['created_at'])
+            )
+            orders_list['statuses'][order_id] = status
+
+            orders_cards.append(
+                {'text': f'{order_statuses_titles[status]} | {created_at}', 'callback_data': f'order_card-{order_id}'}
+            )
 
+        orders_list['pages'][page] = orders_cards
+        orders_list['count'] = orders_page['count']
+        if orders_page['status_counts'] is not None:
+            orders_list['message_text'] = makeOrdersListMessage(orders_page['count'], orders_page['status_counts'])
+
+    return orders_list['pages'][page], orders_list['count']
+
+
+def makeOrdersListMessage(orders_count: int, status_counts: dict) -> str:
     message_text = (
         '*🛒 Список заказов*\n\n'
         + f'🗃️ Всего заказов: {orders_count}\n\n'
         + '🗂 Количество заказов по статусам\n'
     )
-    for status in order_statuses.values():
-        if status['count'] > 0:
-            message_text = message_text + f'{status["title"]}: {status["count"]}'
+    for status, title in order_statuses_titles.items():
+        if status_counts.get(status, 0) > 0:
+            message_text = message_text + f'{title}: {status_counts[status]}'
 
-    await respondEvent(
-        event,
-        text=message_text, 
-        parse_mode="Markdown",
-        reply_markup=keyboard.as_markup(),
-    )
+    return message_text
 
 
 @router.callback_query(F.data.startswith('order_card'))
@@ -92,7 +125,13 @@ async def order_card(event: CallbackQuery) -> None:
     order_id = '-'.join(event.data.split('-')[1:])
 
     mrstone_api = MrStoneAPI()
-    order = mrstone_api.getOrder(order_id)
+    order = await mrstone_api.getOrder(order_id)
+
+    # The cached list shows the old status of the order, so it's rendered again on return
+    username = event.from_user.username
+    orders_list = orders_cache.getValue(username) if username else None
+    if orders_list and orders_list['statuses'].get(order_id) != order['status']:
+        orders_cache.deleteKey(username)
 
     if order['updated_at']:
         updated_at = datetimeToString(
@@ -1,25 +1,126 @@
 from config import settings
 
 from handlers import common, orders
+from api.mrstone import MrStoneAPI
+from middlewares import UserChatMiddleware, CallbackThrottlingMiddleware
+from notifications import OrderEventsConsumer
 
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
+import signal
 import asyncio
+import multiprocessing
 
 
-async def main() -> None:
-    bot = Bot(token=settings.telegram_bot_token)
-    dp = Dispatcher()
+def makeStorage() -> BaseStorage:
+    if settings.fsm_storage == 'redis':
+        return RedisStorage.from_url(
+            settings.redis_url, state_ttl=settings.fsm_state_ttl, data_ttl=settings.fsm_state_ttl
+        )
+    return MemoryStorage()
+
+
+def makeDispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=makeStorage())
 
     # Handlers routers
     dp.include_router(common.router)
     dp.include_router(orders.router)
 
+    dp.update.outer_middleware(UserChatMiddleware())
+    dp.callback_query.outer_middleware(CallbackThrottlingMiddleware())
+
+    # Every process reads its share of the order events while the bot is running
+    order_events_consumer = OrderEventsConsumer()
+    dp.startup.register(order_events_consumer.start)
+    dp.shutdown.register(order_events_consumer.stop)
+
+    # Pooled connections to the MrStone API and the FSM storage are closed when the bot stops
+    dp.shutdown.register(MrStoneAPI.closeSession)
+    dp.shutdown.register(dp.storage.close)
+
+    return dp
+
+
+async def runPolling() -> None:
+    bot = Bot(token=settings.telegram_bot_token)
+    dp = makeDispatcher()
+
+    # Telegram doesn't give updates by polling while a webhook is set
+    await bot.delete_webhook()
     await dp.start_polling(bot)
 
 
+async def setWebhook() -> None:
+    bot = Bot(token=settings.telegram_bot_token)
+    async with bot.session:
+        await bot.set_webhook(
+            url=settings.webhook_base_url.rstrip('/') + settings.webhook_path,
+            secret_token=settings.webhook_secret,
+        )
+
+
+def runWebhookWorker() -> None:
+    """Runs the web server which handles webhook updates.
+    Workers share the port, so the kernel spreads connections between them.
+    """
+
+    bot = Bot(token=settings.telegram_bot_token)
+    dp = makeDispatcher()
+
+    app = web.Application()
+    # The update is handled before the response, so a stopping worker
+    # waits for the updates in progress instead of dropping them
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=settings.webhook_secret, handle_in_background=False
+    ).register(app, path=settings.webhook_path)
+    setup_application(app, dp, bot=bot)
+
+    web.run_app(
+        app,
+        host=settings.webhook_host,
+        port=settings.webhook_port,
+        reuse_port=settings.webhook_workers > 1,
+        shutdown_timeout=settings.webhook_shutdown_timeout,
+    )
+
+
+def runWebhook() -> None:
+    asyncio.run(setWebhook())
+
+    if settings.webhook_workers == 1:
+        return runWebhookWorker()
+
+    workers = [
+        multiprocessing.Process(target=runWebhookWorker, name=f'webhook-worker-{i}')
+        for i in range(settings.webhook_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def stopWorkers(signal_number, frame) -> None:
+        # Every worker stops gracefully on SIGTERM
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    signal.signal(signal.SIGTERM, stopWorkers)
+    signal.signal(signal.SIGINT, stopWorkers)
+
+    for worker in workers:
+        worker.join()
+
+
 if __name__ == '__main__':
     try:
-        asyncio.run(main())
+        if settings.bot_mode == 'webhook':
+            runWebhook()
+        else:
+            asyncio.run(runPolling())
     except (KeyboardInterrupt, RuntimeError):
         print('Bot has been stopped.')
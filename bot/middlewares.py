@@ -0,0 +1,69 @@
+from config import settings
+
+from logs import addLog
+from notifications import saveUserChat
+from cache import TTLCache, redis_client
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, CallbackQuery
+
+import traceback
+from typing import Any, Awaitable, Callable
+
+
+class UserChatMiddleware(BaseMiddleware):
+    "Remembers private chats of users by username, so order notifications can find the customer."
+
+    def __init__(self) -> None:
+        # Chats which were saved recently aren't written again on every update
+        self.saved_chats = TTLCache(ttl=24 * 60 * 60)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get('event_from_user')
+        chat = data.get('event_chat')
+        if user and user.username and chat and chat.type == 'private':
+            if self.saved_chats.getValue(user.username) != chat.id:
+                try:
+                    await saveUserChat(user.username, chat.id)
+                    self.saved_chats.setValue(user.username, chat.id)
+                except Exception:
+                    # The chat is saved on one of the next updates, the bot keeps working when Redis is unavailable
+                    addLog(level='warning', text=f'User chat was not saved.\n\n{traceback.format_exc()}')
+
+        return await handler(event, data)
+
+
+class CallbackThrottlingMiddleware(BaseMiddleware):
+    """
+    Drops repeats of the same callback by the user within the throttle window,
+    so hammering a button makes one backend request instead of one per click.
+    The window is kept in Redis, so it's shared by all the bot workers.
+    """
+
+    def __init__(self, window_ms: int = settings.callback_throttle_ms) -> None:
+        self.window_ms = window_ms
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: dict[str, Any],
+    ) -> Any:
+        throttle_key = f'bot:throttle:{event.from_user.id}:{event.data}'
+        try:
+            is_first_click = await redis_client.set(throttle_key, 1, nx=True, px=self.window_ms)
+        except Exception:
+            # Throttling is an optimization, the click is handled when Redis is unavailable
+            addLog(level='warning', text=f'Callback was not throttled.\n\n{traceback.format_exc()}')
+            is_first_click = True
+
+        if not is_first_click:
+            # Stops the loading indicator of the dropped click
+            return await event.answer()
+
+        return await handler(event, data)
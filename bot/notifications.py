@@ -0,0 +1,231 @@
+from config import settings
+
+from logs import addLog
+from cache import redis_client, orders_cache
+from handlers.orders import order_statuses_titles
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+import os
+import socket
+import asyncio
+import traceback
+
+
+# Stream which is filled by the MrStone API, see `apps.store.events`
+ORDER_EVENTS_STREAM = 'store:events:orders'
+ORDER_EVENTS_GROUP = 'bot-notifications'
+
+# Hash of private chats ids by lowercased Telegram usernames
+USER_CHATS_KEY = 'bot:user_chats'
+
+# Telegram rejects messages longer than 4096 characters, the margin covers emojis
+# which are counted as two characters
+MESSAGE_MAX_LENGTH = 4000
+
+
+def normalizeUsername(username: str) -> str:
+    return username.lstrip('@').lower()
+
+
+async def saveUserChat(username: str, chat_id: int) -> None:
+    await redis_client.hset(USER_CHATS_KEY, normalizeUsername(username), chat_id)
+
+
+async def getUsersChats(usernames: list[str]) -> dict[str, int]:
+    "Returns chats ids of the users who have started the bot."
+
+    chats_ids = await redis_client.hmget(USER_CHATS_KEY, [normalizeUsername(username) for username in usernames])
+    return {username: int(chat_id) for username, chat_id in zip(usernames, chats_ids) if chat_id}
+
+
+class SendRateLimiter:
+    "Spaces messages out to stay under Telegram limits: about 30 messages per second and 1 per second in a chat."
+
+    def __init__(self, messages_per_second: float = 25, chat_interval: float = 1) -> None:
+        self.message_interval = 1 / messages_per_second
+        self.chat_interval = chat_interval
+        self.next_send_at = 0
+        self.chats_next_send_at = {}
+
+    async def wait(self, chat_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        send_at = max(now, self.next_send_at, self.chats_next_send_at.get(chat_id, 0))
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+        self.next_send_at = send_at + self.message_interval
+        self.chats_next_send_at[chat_id] = send_at + self.chat_interval
+
+        # Chats which can already get a message don't need to be remembered
+        if len(self.chats_next_send_at) > 10_000:
+            self.chats_next_send_at = {
+                chat_id: chat_send_at for chat_id, chat_send_at in self.chats_next_send_at.items()
+                if chat_send_at > send_at
+            }
+
+
+class OrderEventsConsumer:
+    """
+    Reads order status events from the Redis stream in batches and notifies customers in Telegram.
+    Events are acknowledged only after they are handled, events of a stopped consumer
+    are claimed by the running ones, so every event is delivered at least once.
+    """
+
+    block_ms = 5_000
+    # Events which weren't acknowledged during this time are claimed from their consumer
+    claim_idle_ms = 60_000
+    error_delay = 5
+
+    def __init__(self, batch_size: int = settings.order_events_batch_size) -> None:
+        self.batch_size = batch_size
+        self.name = f'{socket.gethostname()}-{os.getpid()}'
+        self.rate_limiter = SendRateLimiter()
+        self.task = None
+
+    async def start(self, bot: Bot) -> None:
+        self.task = asyncio.create_task(self.run(bot))
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # The failure is logged, it must not break the rest of the shutdown
+            addLog(level='error', text=f'Order events consumer has failed.\n\n{traceback.format_exc()}')
+        self.task = None
+
+    async def run(self, bot: Bot) -> None:
+        loop = asyncio.get_running_loop()
+        group_created = False
+        claim_at = 0
+        while True:
+            try:
+                # Redis can be unavailable when the bot starts
+                if not group_created:
+                    await self.createGroup()
+                    group_created = True
+
+                if loop.time() >= claim_at:
+                    await self.claimStaleEvents(bot)
+                    claim_at = loop.time() + self.claim_idle_ms / 1000
+
+                response = await redis_client.xreadgroup(
+                    ORDER_EVENTS_GROUP, self.name, {ORDER_EVENTS_STREAM: '>'},
+                    count=self.batch_size, block=self.block_ms,
+                )
+                for stream, entries in response:
+                    await self.handleEntries(bot, entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                addLog(level='error', text=f'Order events were not handled.\n\n{traceback.format_exc()}')
+                await asyncio.sleep(self.error_delay)
+
+    async def createGroup(self) -> None:
+        # A new group starts from new events, so customers don't get notifications about old changes
+        try:
+            await redis_client.xgroup_create(ORDER_EVENTS_STREAM, ORDER_EVENTS_GROUP, id='$', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def claimStaleEvents(self, bot: Bot) -> None:
+        "Takes over events which were read by stopped consumers or failed, and handles them again."
+
+        start_id = '0-0'
+        while True:
+            start_id, entries, *deleted_ids = await redis_client.xautoclaim(
+                ORDER_EVENTS_STREAM, ORDER_EVENTS_GROUP, self.name,
+                min_idle_time=self.claim_idle_ms, start_id=start_id, count=self.batch_size,
+            )
+            await self.handleEntries(bot, entries)
+            if start_id == '0-0':
+                break
+
+    async def handleEntries(self, bot: Bot, entries: list) -> None:
+        "Sends one message per customer for the batch and acknowledges the handled events."
+
+        if not entries:
+            return
+
+        handled_ids = []
+        users_events = {}
+        for entry_id, event in entries:
+            # Deleted entries come without fields
+            if not event or event.get('contact_type') != 'telegram':
+                handled_ids.append(entry_id)
+                continue
+            users_events.setdefault(event['contact'], []).append((entry_id, event))
+
+        users_chats = await getUsersChats(list(users_events)) if users_events else {}
+        for username, user_events in users_events.items():
+            # The user's cached order list shows old statuses
+            orders_cache.deleteKey(username)
+
+            chat_id = users_chats.get(username)
+            # Events of users who haven't started the bot can't be delivered
+            if chat_id is None or await self.notifyUser(bot, chat_id, [event for entry_id, event in user_events]):
+                handled_ids.extend(entry_id for entry_id, event in user_events)
+
+        if handled_ids:
+            await redis_client.xack(ORDER_EVENTS_STREAM, ORDER_EVENTS_GROUP, *handled_ids)
+
+    async def notifyUser(self, bot: Bot, chat_id: int, events: list[dict]) -> bool:
+        "Returns `False` if the messages should be sent again later."
+
+        # Only the last status of every order is shown
+        orders_statuses = {}
+        for event in events:
+            orders_statuses[event['order_id']] = event['status']
+
+        for message_text in makeNotificationMessages(orders_statuses):
+            if not await self.sendMessage(bot, chat_id, message_text):
+                return False
+        return True
+
+    async def sendMessage(self, bot: Bot, chat_id: int, message_text: str) -> bool:
+        while True:
+            await self.rate_limiter.wait(chat_id)
+            try:
+                await bot.send_message(chat_id=chat_id, text=message_text, parse_mode='Markdown')
+                return True
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError:
+                # The user has blocked the bot
+                return True
+            except TelegramBadRequest:
+                # The chat doesn't exist anymore or the message can't be sent at all, sending it again won't help
+                addLog(level='warning', text=f'Order notification was rejected.\n\n{traceback.format_exc()}')
+                return True
+            except Exception:
+                addLog(level='error', text=f'Order notification was not sent.\n\n{traceback.format_exc()}')
+                return False
+
+
+def makeNotificationMessages(orders_statuses: dict[str, str]) -> list[str]:
+    "Splits the orders statuses into messages which fit into the Telegram message length limit."
+
+    header = '*🔔 Статус заказа изменён*\n\n'
+    messages = []
+    message_text = header
+    for order_id, status in orders_statuses.items():
+        order_text = (
+            f'*🆔 Номер заказа:* `{order_id}`\n'
+            + f'*Статус:* {order_statuses_titles.get(status, status)}\n\n'
+        )
+        if message_text != header and len(message_text) + len(order_text) > MESSAGE_MAX_LENGTH:
+            messages.append(message_text)
+            message_text = header
+        message_text += order_text
+
+    messages.append(message_text)
+    return messages
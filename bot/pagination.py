@@ -1,27 +1,31 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 import math
+from typing import Awaitable, Callable
+
+
+# Returns items of the page by its number and size, and the number of all the items
+PageSource = Callable[[int, int], Awaitable[tuple[list, int]]]
 
 
 class Paginator:
-    def __init__(self, array: list|tuple, offset: int, page_callback: str, back_callback: str = None) -> None:
-        self.array = array
+    def __init__(self, page_source: PageSource, offset: int, page_callback: str, back_callback: str = None) -> None:
+        """
+        :param page_source: fetches only the required page, so the whole list is never loaded.
+        :param offset: number of items on a page.
+        """
+
+        self.page_source = page_source
         self.offset = offset
-        self.pages_count = math.ceil(len(array) / offset)
+        self.pages_count = 0
         self.page_callback = page_callback
         self.back_callback = back_callback
 
-    def getPageKeyboard(self, page: int) -> InlineKeyboardBuilder:
-        "Creates a pagination keyboard for the required page."
-
-        if page > self.pages_count:
-            return ValueError(
-                f'Page number value cannot be higher than pages count [page: {page} / {self.pages_count}].'
-            )
+    async def getPageKeyboard(self, page: int) -> InlineKeyboardBuilder:
+        "Fetches the required page and creates a pagination keyboard for it."
 
-        start_index =  self.offset * (page - 1)
-        end_index = start_index + self.offset
-        array_items = self.array[start_index:end_index]
+        array_items, items_count = await self.page_source(page, self.offset)
+        self.pages_count = math.ceil(items_count / self.offset)
         array_items_count = len(array_items)
         
         keyboard = InlineKeyboardBuilder()
@@ -0,0 +1,160 @@
+import telegram_api
+from config import project_settings
+
+import os
+import json
+import time
+import hashlib
+import traceback
+from collections import deque
+
+
+# Telegram doesn't accept messages longer than 4096 characters
+MESSAGE_MAX_LENGTH = 4000
+
+# Exceptions are identified by the project code where they were raised, backend/
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def isProjectFile(filename: str) -> bool:
+    path = os.path.abspath(filename)
+    # Virtual environments can be created inside the project directory
+    return path.startswith(PROJECT_ROOT + os.sep) and 'site-packages' not in path.split(os.sep)
+
+
+def makeExceptionFingerprint(exception: Exception) -> str:
+    """Identifies the exception by its type and the place where it was raised.
+    The place is the innermost frame of the project code, since exceptions are usually raised by libraries,
+    and the same library line is reached from unrelated places.
+    """
+
+    frames = traceback.extract_tb(exception.__traceback__)
+    project_frames = [frame for frame in frames if isProjectFile(frame.filename)]
+    if project_frames:
+        frame = project_frames[-1]
+        location = f'{os.path.relpath(frame.filename, PROJECT_ROOT)}:{frame.lineno}'
+    elif frames:
+        location = f'{frames[-1].filename}:{frames[-1].lineno}'
+    else:
+        location = ''
+    return f'{type(exception).__name__}@{location}'
+
+
+def makeMessageFingerprint(level: str, message: str) -> str:
+    message_hash = hashlib.sha1(str(message).encode('utf-8')).hexdigest()
+    return f'{level}:{message_hash}'
+
+
+class AlertAggregator:
+    """
+    Sends log records to Telegram, grouping them by fingerprint.
+
+    The first record of a fingerprint is sent immediately, repeats inside the window
+    are counted and sent as one digest message when the window is over.
+    Messages are sent not faster than `max_messages_per_second`,
+    the rest waits in a bounded queue.
+    """
+
+    def __init__(self, window: int = 60, max_messages_per_second: float = 20, max_pending_messages: int = 1000) -> None:
+        self.window = window
+        self.max_messages_per_second = max_messages_per_second
+        self.send_interval = 1 / max_messages_per_second
+        self.alerts = {}
+        self.pending_messages = deque(maxlen=max_pending_messages)
+        self.last_sent_at = 0
+        self.paused_until = 0
+
+    def add(self, record: dict) -> None:
+        now = time.monotonic()
+        fingerprint = record['fingerprint']
+
+        alert = self.alerts.get(fingerprint)
+        if alert:
+            alert['record'] = record
+            alert['repeats_count'] += 1
+        else:
+            self.alerts[fingerprint] = {'record': record, 'repeats_count': 0, 'window_started_at': now}
+            self.queueMessages(record)
+
+    def flush(self) -> list:
+        """Queues digests of the finished windows and sends pending messages within the rate limit.
+        Returns failed API responses.
+        """
+
+        now = time.monotonic()
+        for fingerprint, alert in list(self.alerts.items()):
+            if now - alert['window_started_at'] < self.window:
+                continue
+
+            if alert['repeats_count']:
+                self.queueMessages(alert['record'], alert['repeats_count'])
+                alert['repeats_count'] = 0
+                alert['window_started_at'] = now
+            else:
+                del self.alerts[fingerprint]
+
+        return self.sendPendingMessages()
+
+    def queueMessages(self, record: dict, repeats_count: int = 0) -> None:
+        level = record['level']
+        disable_notification = level.lower() not in ['error', 'critical']
+
+        message_text = f"*[{level.upper()}]* _({record['created_at']})_\n\n"
+        if repeats_count:
+            message_text += f"*🔁 x{repeats_count} in last {self.window}s*\n\n"
+        message_text += (
+            f"*Expection message:*\n`{record['message']}`\n"
+            + f"*Exceptions details:*\n`{record['details']}`"
+        )
+        if len(message_text) > MESSAGE_MAX_LENGTH:
+            message_text = message_text[:MESSAGE_MAX_LENGTH] + '`\n…'
+
+        for user_id in project_settings.TELEGRAM_LOGS_BOT_USERS:
+            self.pending_messages.append({
+                'chat_id': user_id,
+                'text': message_text,
+                'parse_mode': 'Markdown',
+                'disable_notification': disable_notification,
+            })
+
+    def sendPendingMessages(self) -> list:
+        """Sends pending messages allowed by the rate limit, returns failed API responses.
+        It is called about once a second, so one call sends up to a second's worth of messages.
+        """
+
+        failed_responses = []
+        sent_count = 0
+        while self.pending_messages and sent_count < self.max_messages_per_second:
+            now = time.monotonic()
+            if now < self.paused_until:
+                break
+
+            delay = self.send_interval - (now - self.last_sent_at)
+            if delay > 0:
+                time.sleep(delay)
+
+            parameters = self.pending_messages.popleft()
+            response = telegram_api.sendRequest(
+                project_settings.TELEGRAM_LOGS_BOT_TOKEN,
+                request_method='POST',
+                api_method='sendMessage',
+                parameters=parameters,
+            )
+            self.last_sent_at = time.monotonic()
+            sent_count += 1
+
+            if response['code'] == 429:
+                # Telegram asks to wait before the next request, the message is retried later
+                self.pending_messages.appendleft(parameters)
+                self.paused_until = self.last_sent_at + getRetryAfter(response)
+            elif response['code'] != 200:
+                failed_responses.append(response)
+
+        return failed_responses
+
+
+def getRetryAfter(response: dict, default: int = 5) -> int:
+    try:
+        return int(json.loads(response['text'])['parameters']['retry_after'])
+    except (ValueError, TypeError, KeyError):
+        return default
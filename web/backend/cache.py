@@ -1,6 +1,10 @@
 from config import project_settings
 
 import redis
+import redis.asyncio
+import asyncio
+import weakref
+from redis.commands.core import Script, AsyncScript
 
 
 redis_pool = redis.ConnectionPool(
@@ -11,6 +15,23 @@ redis_pool = redis.ConnectionPool(
 )
 
 
+# Async connections belong to the event loop they were opened in, so every loop gets its own pool
+async_redis_pools = weakref.WeakKeyDictionary()
+
+
+def getAsyncRedisPool() -> redis.asyncio.ConnectionPool:
+    loop = asyncio.get_running_loop()
+    pool = async_redis_pools.get(loop)
+    if pool is None:
+        pool = async_redis_pools[loop] = redis.asyncio.ConnectionPool(
+            host=project_settings.CACHE_HOST,
+            port=project_settings.CACHE_PORT,
+            db=project_settings.CACHE_DB,
+            max_connections=project_settings.CACHE_MAX_CONNECTIONS,
+        )
+    return pool
+
+
 MINUTE_SECONDS = 60
 HOUR_SECONDS = MINUTE_SECONDS ** 2
 DAY_SECONDS = HOUR_SECONDS * 24
@@ -28,6 +49,13 @@ class Cache:
         if value:
             return value.decode('utf-8')
 
+    def getValues(self, keys: list[str]) -> list[str | None]:
+        values: list[bytes | None] = self.redis_client.mget(keys)
+        return [value.decode('utf-8') if value else None for value in values]
+
+    def incrementValue(self, key: str) -> int:
+        return self.redis_client.incr(key)
+
     def deleteKey(self, key: str) -> None:
         self.redis_client.delete(key)
 
@@ -35,3 +63,55 @@ class Cache:
         ttl = self.redis_client.ttl(key)
         if ttl not in [-2, -1]:
             return ttl
+
+    def addStreamEntries(self, stream: str, entries: list[dict], max_length: int) -> None:
+        """Appends the entries to the stream with one round trip.
+
+        :param max_length: approximate number of the last entries which are kept in the stream.
+        """
+
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for entry in entries:
+            pipeline.xadd(stream, entry, maxlen=max_length, approximate=True)
+        pipeline.execute()
+
+    def registerScript(self, script: str) -> Script:
+        """Registers a Lua script which is executed atomically on the Redis server.
+
+        :param script: Lua script source.
+        """
+
+        return self.redis_client.register_script(script)
+
+
+class AsyncCache:
+    "Non-blocking version of `Cache` for async views and middleware, must be created inside the event loop."
+
+    def __init__(self) -> None:
+        self.redis_client = redis.asyncio.Redis(connection_pool=getAsyncRedisPool())
+
+    async def setValue(self, key: str, value: str, expire: int = DAY_SECONDS) -> None:
+        await self.redis_client.set(key, value, ex=expire)
+
+    async def getValue(self, key: str) -> str | None:
+        value: bytes | None = await self.redis_client.get(key)
+        if value:
+            return value.decode('utf-8')
+
+    async def getValues(self, keys: list[str]) -> list[str | None]:
+        values: list[bytes | None] = await self.redis_client.mget(keys)
+        return [value.decode('utf-8') if value else None for value in values]
+
+    async def incrementValue(self, key: str) -> int:
+        return await self.redis_client.incr(key)
+
+    async def deleteKey(self, key: str) -> None:
+        await self.redis_client.delete(key)
+
+    def registerScript(self, script: str) -> AsyncScript:
+        """Registers a Lua script which is executed atomically on the Redis server, the script call is awaitable.
+
+        :param script: Lua script source.
+        """
+
+        return self.redis_client.register_script(script)
@@ -12,6 +12,20 @@ class ProjectSettings(BaseSettings):
     DB_NAME: str
     DB_USER: str
     DB_PASSWORD: str
+    # Seconds a connection is reused between requests, 0 closes it after every request.
+    # By default connections are reused under WSGI only, Django doesn't support persistent connections under ASGI
+    DB_CONN_MAX_AGE: int | None = None
+    DB_CONN_HEALTH_CHECKS: bool = True
+
+    # Read replica, GET requests read from it when the host is set.
+    # Missing connection params are taken from the primary database
+    DB_REPLICA_HOST: str | None = None
+    DB_REPLICA_PORT: int | None = None
+    DB_REPLICA_NAME: str | None = None
+    DB_REPLICA_USER: str | None = None
+    DB_REPLICA_PASSWORD: str | None = None
+    # Seconds the client reads from the primary after its write, so it sees the written data
+    DB_REPLICA_PRIMARY_PIN_SECONDS: int = 5
 
     # Cache
     CACHE_HOST: str
@@ -19,6 +33,9 @@ class ProjectSettings(BaseSettings):
     CACHE_DB: int
     CACHE_MAX_CONNECTIONS: int
 
+    # Media
+    PRODUCT_IMAGE_WORKERS: int = 2
+
     # Telegram Bots
     TELEGRAM_LOGS_BOT_TOKEN: str
     TELEGRAM_LOGS_BOT_USERS: list
@@ -1,9 +1,11 @@
-import telegram_api
-from config import project_settings
+from alerts import AlertAggregator, makeMessageFingerprint
 
 import os
+import queue
+import atexit
 import datetime
 import logging
+import threading
 
 
 # Create a custom formatter
@@ -17,67 +19,201 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
-def addLog(level: str, message: str, details: str = None, send_telegram_message: bool = False) -> None:
+class LogWriter:
     """
-    Adds new log to file, console and telegram chat.
-
-    :param level: log level (`info`, 'debug', 'warning', 'error', 'critical').
-    :param message: log message.
-    :param send_telegram_message: determines whether a log will be sent to telegram chat.
+    Writes logs to files and Telegram in a background thread,
+    so the request thread only puts a record into a bounded queue.
+    When the queue is full, records are dropped and counted.
     """
-    
-    # Write the log into the log file
-    now = datetime.datetime.now()
-    path = f"logs/{now.year}/{now.month}/{now.day}/"
-    filename = path + f"log-{now.hour}.log"
-
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(filename, 'a') as file:
+
+    stop_record = None
+
+    def __init__(self, queue_size: int = 10_000, batch_size: int = 100, tick_interval: float = 1) -> None:
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.tick_interval = tick_interval
+
+        self.alert_aggregator = AlertAggregator()
+
+        self.dropped_count = 0
+        self.dropped_count_lock = threading.Lock()
+
+        self.file = None
+        self.file_path = None
+
+        self.thread = None
+        self.thread_pid = None
+        self.thread_lock = threading.Lock()
+
+    def put(self, record: dict) -> bool:
+        "Puts the log record into the queue without blocking, returns `False` if the record was dropped."
+
+        self.start()
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.dropped_count_lock:
+                self.dropped_count += 1
+            return False
+        return True
+
+    def start(self) -> None:
+        "Starts the writer thread, also in every process forked after the module import."
+
+        if self.thread_pid == os.getpid():
+            return
+
+        with self.thread_lock:
+            if self.thread_pid != os.getpid():
+                self.thread = threading.Thread(target=self.run, name='log-writer', daemon=True)
+                self.thread.start()
+                self.thread_pid = os.getpid()
+                atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5) -> None:
+        "Writes the queued records and stops the writer thread."
+
+        if self.thread_pid != os.getpid():
+            return
+
+        try:
+            self.queue.put(self.stop_record, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+
+    def run(self) -> None:
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.tick_interval)]
+            except queue.Empty:
+                batch = []
+
+            while batch and len(batch) < self.batch_size and batch[-1] is not self.stop_record:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = bool(batch) and batch[-1] is self.stop_record
+            if stop:
+                batch.pop()
+
+            try:
+                self.writeBatch(batch)
+            except Exception:
+                logger.exception('Log records batch was not written')
+
+            try:
+                self.sendAlerts()
+            except Exception:
+                logger.exception('Telegram alerts were not sent')
+
+            if stop:
+                self.closeFile()
+                break
+
+    def writeBatch(self, batch: list) -> None:
+        with self.dropped_count_lock:
+            dropped_count, self.dropped_count = self.dropped_count, 0
+        if dropped_count:
+            batch.append(makeLogRecord(
+                level='warning',
+                message=f'{dropped_count} log records were dropped, the log queue was full.'
+            ))
+
+        if not batch:
+            return
+
+        for record in batch:
+            self.writeRecord(record)
+        self.file.flush()
+
+        for record in batch:
+            if record['send_telegram_message']:
+                self.alert_aggregator.add(record)
+
+    def sendAlerts(self) -> None:
+        failed_responses = self.alert_aggregator.flush()
+        for response in failed_responses:
+            self.writeRecord(makeLogRecord(
+                level='error',
+                message="Telegram message with last error log didn't send.",
+                details=f"API response: {response['text']}",
+            ))
+        if failed_responses:
+            self.file.flush()
+
+    def getFile(self, created_at: datetime.datetime):
+        "Returns the log file of the record hour, the file stays open until the hour changes."
+
+        path = f"logs/{created_at.year}/{created_at.month}/{created_at.day}/"
+        file_path = path + f"log-{created_at.hour}.log"
+
+        if file_path != self.file_path:
+            self.closeFile()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.file = open(file_path, 'a')
+            self.file_path = file_path
+
+        return self.file
+
+    def closeFile(self) -> None:
+        if self.file:
+            self.file.close()
+            self.file = None
+            self.file_path = None
+
+    def writeRecord(self, record: dict) -> None:
+        file = self.getFile(record['created_at'])
+
         separator_string = f"\n\n{'='*50}\n\n"
         log = (
             "{0} [{1}]\n\n"
             + "Exception message:\n{2}\n"
-            + "Exception details:\n{3}" 
+            + "Exception details:\n{3}"
             + separator_string
         )
+        created_at, level, message, details = (
+            record['created_at'], record['level'], record['message'], record['details']
+        )
         try:
-            file.write(log.format(now, level, message, details))
+            file.write(log.format(created_at, level, message, details))
         except:
-            message = message.encode('utf-8')
-            details = details.encode('utf-8')
-            file.write(log.format(now, level, message, details))
-
-    # Send the log message to Telegram Bot users
-    if send_telegram_message:
-        bot_token: str = project_settings.TELEGRAM_LOGS_BOT_TOKEN
-        recepients: list = project_settings.TELEGRAM_LOGS_BOT_USERS
-
-        disable_notification = True
-        if level.lower() in ['error', 'critical']:
-            disable_notification = False
-
-        for user_id in recepients:
-            response = telegram_api.sendRequest(
-                bot_token,
-                request_method='POST',
-                api_method='sendMessage',
-                parameters={
-                    'chat_id': user_id,
-                    'message': (
-                        f"*[{level.upper()}]* _({now})_\n\n"
-                        + f"*Expection message:*\n`{message}`\n"
-                        + f"*Exceptions details:*\n`{details}`"
-                    ),
-                    'parse_mode': 'Markdown',
-                    'disable_notification': disable_notification,
-                }
-            )
-            
-            if response['code'] == 400:
-                addLog(
-                    level='error', 
-                    message=(
-                        "Telegram message with last error log didn't send.\n",
-                        f"API response: {response['text']}"
-                    )
-                )
+            message = str(message).encode('utf-8')
+            details = str(details).encode('utf-8')
+            file.write(log.format(created_at, level, message, details))
+
+def makeLogRecord(
+    level: str, message: str, details: str = None, send_telegram_message: bool = False, fingerprint: str = None
+) -> dict:
+    return {
+        'created_at': datetime.datetime.now(),
+        'level': level,
+        'message': message,
+        'details': details,
+        'send_telegram_message': send_telegram_message,
+        'fingerprint': fingerprint or makeMessageFingerprint(level, message),
+    }
+
+
+log_writer = LogWriter()
+
+
+def addLog(
+    level: str, message: str, details: str = None, send_telegram_message: bool = False, fingerprint: str = None
+) -> None:
+    """
+    Adds new log to file, console and telegram chat.
+    The log is written by the background writer, so the call doesn't wait for disk or Telegram.
+
+    :param level: log level (`info`, 'debug', 'warning', 'error', 'critical').
+    :param message: log message.
+    :param send_telegram_message: determines whether a log will be sent to telegram chat.
+    :param fingerprint: identifies repeats of the log which are grouped in one telegram message,
+    by default it's made from the level and the message.
+    """
+
+    record = makeLogRecord(level, message, details, send_telegram_message, fingerprint)
+    log_writer.put(record)
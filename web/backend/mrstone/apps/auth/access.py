@@ -3,12 +3,61 @@ from django.http import JsonResponse
 
 from utils import getCurrentDateTime, makeResponseData
 
-from apps.auth.models import AuthToken
-from apps.auth.utils import hashAuthToken
+from apps.auth.models import AuthToken, User
+from apps.auth.utils import hashAuthToken, generateAuthToken, splitAuthToken, AUTH_TOKEN_SEPARATOR
 
 import secrets
 
 
+def isTokenMatching(plain_token: str, token_record: dict) -> bool:
+    "Compares the plain token with the hash stored in the token record."
+
+    salt = bytes.fromhex(token_record['salt_hex'])
+    cadidate_token_hash, salt_hex = hashAuthToken(plain_token, salt)
+    return secrets.compare_digest(cadidate_token_hash, token_record['token_hash'])
+
+
+def createAuthToken(user: User, expires_at=None) -> str:
+    """Issues a new token for the user and returns it in plain text, only its hash is stored.
+
+    The token has the `<public_id>.<secret>` format, the random public id is stored
+    as is and is used to find the record without hashing any other tokens.
+    """
+
+    public_id, secret = generateAuthToken()
+    token_hash, salt_hex = hashAuthToken(secret)
+    AuthToken.objects.create(
+        user=user, public_id=public_id, token_hash=token_hash, salt_hex=salt_hex, expires_at=expires_at
+    )
+    return f'{public_id}{AUTH_TOKEN_SEPARATOR}{secret}'
+
+
+def getAuthTokenRecord(plain_token: str) -> dict | None:
+    """Finds an active token record which matches the plain token.
+
+    Tokens with a public id are looked up by it, so a check costs one row fetch
+    and one hash comparison regardless of the number of tokens.
+    Only tokens in the legacy format (without a public id) are checked against
+    the legacy records one by one, until they are revoked with `revoke_legacy_auth_tokens`.
+    """
+
+    public_id, secret = splitAuthToken(plain_token)
+    active_tokens = AuthToken.objects.filter(
+        Q(expires_at__gt=getCurrentDateTime()) | Q(expires_at__isnull=True), revoked=False
+    )
+
+    if public_id is not None:
+        token_record = active_tokens.filter(public_id=public_id).values('id', 'token_hash', 'salt_hex').first()
+        if token_record and isTokenMatching(secret, token_record):
+            return token_record
+        return None
+
+    legacy_token_records = active_tokens.filter(public_id__isnull=True).values('id', 'token_hash', 'salt_hex')
+    for token_record in legacy_token_records.iterator():
+        if isTokenMatching(secret, token_record):
+            return token_record
+
+
 def checkAuthToken(view_func):
     "Verifies the authenticity of the transmitted authorization token before executing the request."
 
@@ -18,17 +67,9 @@ def checkAuthToken(view_func):
         if auth_header:
             plain_token = auth_header.split()[1]
 
-            potential_tokens = AuthToken.objects.filter(
-                Q(expires_at__gt=getCurrentDateTime()) | Q(expires_at__isnull=True), revoked=False
-            ).values('token_hash', 'salt_hex')
-
-            for token_record in potential_tokens:
-                salt = bytes.fromhex(token_record['salt_hex'])
-                cadidate_token_hash, salt_hex = hashAuthToken(plain_token, salt)
-
-                if secrets.compare_digest(cadidate_token_hash, token_record['token_hash']):
-                    result = view_func(*args, **kwargs)
-                    return result
+            if getAuthTokenRecord(plain_token):
+                result = view_func(*args, **kwargs)
+                return result
 
         response_data = makeResponseData(status=403, message='Invalid auth token')
         return JsonResponse(response_data, status=403)
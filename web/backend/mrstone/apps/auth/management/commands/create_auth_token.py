@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.auth.access import createAuthToken
+from apps.auth.models import User
+
+
+class Command(BaseCommand):
+    help = 'Issues a new auth token for the user and prints it, the plain token is not stored anywhere.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_name', type=str, help='Name of the token owner')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(name=options['user_name'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["user_name"]} does not exist')
+
+        self.stdout.write(createAuthToken(user))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.auth.models import AuthToken
+
+
+class Command(BaseCommand):
+    help = (
+        'Revokes active auth tokens created before public ids were introduced. '
+        'Their plain tokens have no public id, so every check of them hashes all legacy records. '
+        'Issue replacements with `create_auth_token` first.'
+    )
+
+    def handle(self, *args, **options):
+        revoked_count = AuthToken.objects.filter(public_id__isnull=True, revoked=False).update(revoked=True)
+        self.stdout.write(f'Revoked tokens: {revoked_count}')
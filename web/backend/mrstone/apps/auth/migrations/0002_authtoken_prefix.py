@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authtoken',
+            name='prefix',
+            field=models.CharField(blank=True, db_index=True, max_length=8, null=True),
+        ),
+    ]
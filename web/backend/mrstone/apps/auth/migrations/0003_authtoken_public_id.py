@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def clearTokenPrefixes(apps, schema_editor):
+    # Prefixes were the first characters of plain tokens, these records are checked as legacy ones now
+    AuthToken = apps.get_model('auth', 'AuthToken')
+    AuthToken.objects.filter(prefix__isnull=False).update(prefix=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0002_authtoken_prefix'),
+    ]
+
+    operations = [
+        migrations.RunPython(clearTokenPrefixes, migrations.RunPython.noop),
+        migrations.RenameField(
+            model_name='authtoken',
+            old_name='prefix',
+            new_name='public_id',
+        ),
+        migrations.AlterField(
+            model_name='authtoken',
+            name='public_id',
+            field=models.CharField(blank=True, max_length=16, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,122 @@
+from django.test import TestCase
+from django.core.management import call_command
+
+from apps.auth.models import User, AuthToken
+from apps.auth.utils import hashAuthToken
+from apps.auth.access import createAuthToken, getAuthTokenRecord
+
+import io
+import uuid
+import time
+from unittest import mock
+
+
+class AuthTokenTests(TestCase):
+    def createLegacyTokens(self, user: User, count: int) -> str:
+        tokens_to_create = []
+        for i in range(count):
+            plain_auth_token = str(uuid.uuid4())
+            auth_token_hash, auth_token_salt_hex = hashAuthToken(plain_auth_token)
+            tokens_to_create.append(
+                AuthToken(user=user, token_hash=auth_token_hash, salt_hex=auth_token_salt_hex)
+            )
+        AuthToken.objects.bulk_create(tokens_to_create)
+        return plain_auth_token
+
+
+    def testCreatedTokenLookup(self):
+        user = User.objects.create(name='test_user')
+
+        plain_auth_token = createAuthToken(user)
+        public_id, secret = plain_auth_token.split('.', 1)
+        token = AuthToken.objects.get(user=user)
+        self.assertEqual(token.public_id, public_id)
+        self.assertNotIn(token.public_id, secret)
+
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(getAuthTokenRecord(plain_auth_token))
+
+        self.assertIsNone(getAuthTokenRecord(plain_auth_token + 'extra_chars'))
+        self.assertIsNone(getAuthTokenRecord(secret))
+
+
+    def testUnknownTokenDoesNotScanLegacyTokens(self):
+        user = User.objects.create(name='test_user')
+        self.createLegacyTokens(user, 10)
+        plain_auth_token = createAuthToken(user)
+        public_id, secret = plain_auth_token.split('.', 1)
+
+        with mock.patch('apps.auth.access.hashAuthToken', wraps=hashAuthToken) as hash_auth_token:
+            self.assertIsNone(getAuthTokenRecord(f'{uuid.uuid4().hex[:16]}.{secret}'))
+            self.assertIsNone(getAuthTokenRecord(f'{public_id}.{uuid.uuid4()}'))
+        self.assertEqual(hash_auth_token.call_count, 1)
+
+
+    def testLegacyTokensStayValid(self):
+        user = User.objects.create(name='test_user')
+        oldest_plain_auth_token = self.createLegacyTokens(user, 1)
+        self.createLegacyTokens(user, 200)
+
+        self.assertIsNotNone(getAuthTokenRecord(oldest_plain_auth_token))
+
+
+    def testRevokingLegacyTokensKeepsCreatedTokens(self):
+        user = User.objects.create(name='test_user')
+        legacy_plain_auth_token = self.createLegacyTokens(user, 3)
+        plain_auth_token = createAuthToken(user)
+
+        stdout = io.StringIO()
+        call_command('revoke_legacy_auth_tokens', stdout=stdout)
+        self.assertEqual(stdout.getvalue().strip(), 'Revoked tokens: 3')
+
+        self.assertIsNone(getAuthTokenRecord(legacy_plain_auth_token))
+        self.assertIsNotNone(getAuthTokenRecord(plain_auth_token))
+
+        with mock.patch('apps.auth.access.hashAuthToken', wraps=hashAuthToken) as hash_auth_token:
+            self.assertIsNone(getAuthTokenRecord(str(uuid.uuid4())))
+        self.assertEqual(hash_auth_token.call_count, 0)
+
+
+    def testCreateAuthTokenCommand(self):
+        User.objects.create(name='test_user')
+
+        stdout = io.StringIO()
+        call_command('create_auth_token', 'test_user', stdout=stdout)
+        self.assertIsNotNone(getAuthTokenRecord(stdout.getvalue().strip()))
+
+
+    def testLookupTimeDoesNotGrowWithTokensCount(self):
+        user = User.objects.create(name='test_user')
+
+        def createTokens(count: int) -> str:
+            tokens_to_create = []
+            for i in range(count):
+                auth_token_hash, auth_token_salt_hex = hashAuthToken(str(uuid.uuid4()))
+                tokens_to_create.append(
+                    AuthToken(
+                        user=user,
+                        public_id=uuid.uuid4().hex[:16],
+                        token_hash=auth_token_hash,
+                        salt_hex=auth_token_salt_hex,
+                    )
+                )
+            AuthToken.objects.bulk_create(tokens_to_create)
+            return createAuthToken(user)
+
+        def measureLookup(plain_auth_token: str, attempts: int = 100) -> float:
+            started_at = time.perf_counter()
+            for i in range(attempts):
+                getAuthTokenRecord(plain_auth_token)
+            return (time.perf_counter() - started_at) / attempts
+
+        plain_auth_token = createTokens(10)
+        small_table_time = measureLookup(plain_auth_token)
+
+        plain_auth_token = createTokens(10_000)
+        large_table_time = measureLookup(plain_auth_token)
+
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(getAuthTokenRecord(plain_auth_token))
+
+        # A full scan would hash all 10k tokens, which is orders of magnitude slower
+        self.assertLess(large_table_time, small_table_time * 10)
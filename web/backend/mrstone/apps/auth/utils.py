@@ -3,6 +3,12 @@ import secrets
 import base64
 
 
+# Tokens are issued as `<public_id>.<secret>`, the public id is random and is used to find the token record
+AUTH_TOKEN_PUBLIC_ID_BYTES = 8
+AUTH_TOKEN_SECRET_BYTES = 32
+AUTH_TOKEN_SEPARATOR = '.'
+
+
 def hashAuthToken(token: str, salt: bytes = None) -> tuple[str, str]:
     """
     Hash a token using SHA-256 with salt.
@@ -22,3 +28,28 @@ def hashAuthToken(token: str, salt: bytes = None) -> tuple[str, str]:
     
     # Return base64 encoded hash and hex encoded salt
     return base64.b64encode(hashed).decode('utf-8'), salt.hex()
+
+
+def generateAuthToken() -> tuple[str, str]:
+    """
+    Generate the public id and the secret of a new token, the plain token is `<public_id>.<secret>`.
+    """
+
+    public_id = secrets.token_hex(AUTH_TOKEN_PUBLIC_ID_BYTES)
+    secret = secrets.token_urlsafe(AUTH_TOKEN_SECRET_BYTES)
+    return public_id, secret
+
+
+def splitAuthToken(token: str) -> tuple[str | None, str]:
+    """
+    Split the plain token into the public id and the secret.
+    Tokens issued before public ids were introduced have no public id, the whole token is their secret.
+
+    :param token: The plain text token
+    """
+
+    if AUTH_TOKEN_SEPARATOR not in token:
+        return None, token
+
+    public_id, secret = token.split(AUTH_TOKEN_SEPARATOR, 1)
+    return public_id, secret
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class StoreConfig(AppConfig):
     name = 'apps.store'
+
+    def ready(self):
+        from apps.store import signals
@@ -0,0 +1,17 @@
+from django.urls import path
+
+from apps.store import views, async_views
+
+
+# Routes of the ASGI application, read views run on the event loop
+urlpatterns = [
+    path('products/categories/', async_views.CategoryList.as_view(), name='category_list'),
+    path('products/categories/<str:category_slug>/', async_views.CategoryDetail.as_view(), name='category_detail'),
+    path('products/', async_views.ProductList.as_view(), name='product_list'),
+    path('products/search/', views.ProductSearch.as_view(), name='product_search'),
+    path('products/import/', views.ProductImport.as_view(), name='product_import'),
+    path('products/<str:product_slug>/', async_views.ProductDetail.as_view(), name='product_detail'),
+    path('orders/', async_views.OrderList.as_view(), name='order_list'),
+    path('orders/status/', views.OrderStatusBulk.as_view(), name='order_status_bulk'),
+    path('orders/<str:order_id>/', async_views.OrderDetail.as_view(), name='order_detail'),
+]
@@ -0,0 +1,223 @@
+from rest_framework.utils.encoders import JSONEncoder
+
+from django.views import View
+from django.http import HttpRequest, JsonResponse
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from asgiref.sync import sync_to_async
+
+from utils import makeResponseData, decodeCursor, paginateByCursorAsync
+
+from apps.store import views
+from apps.store.models import Category, Product, Order
+from apps.store.serializers import CategorySerializer, ProductSerializer, OrderSerializer
+from apps.store.caching import cacheResponseAsync, conditionalResponseAsync
+from apps.store.schemas import ProductListPageScheme, OrderListPageScheme
+
+import uuid
+from pydantic import ValidationError
+
+
+def makeJsonResponse(response_data: dict, status: int) -> JsonResponse:
+    "Renders the response data the same way as the JSON renderer of the sync views."
+
+    return JsonResponse(response_data, status=status, encoder=JSONEncoder, json_dumps_params={'ensure_ascii': False})
+
+
+def makeErrorResponse(status: int, message: str, details=None) -> JsonResponse:
+    response_data = {'errors': [makeResponseData(status=status, message=message, details=details)]}
+    return makeJsonResponse(response_data, status)
+
+
+def makeNotFoundResponse() -> JsonResponse:
+    # Same body as `Http404` gets from the exception handler of the sync views
+    return makeErrorResponse(404, 'Validation error', 'Not found.')
+
+
+class AsyncReadView(View):
+    """
+    Serves GET requests on the event loop with the async ORM and the async cache.
+    Other methods are handed to the sync view, so writes keep their validation and auth checks.
+    """
+
+    sync_view_class = None
+    sync_view = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(sync_view=cls.sync_view_class.as_view(), **initkwargs)
+        # Async views can't run in the request transaction, the sync views open one for writes themselves
+        return transaction.non_atomic_requests(view)
+
+    async def dispatch(self, request: HttpRequest, *args, **kwargs):
+        if request.method == 'GET':
+            return await self.get(request, *args, **kwargs)
+        return await sync_to_async(self.handleSyncRequest)(request, *args, **kwargs)
+
+    def handleSyncRequest(self, request: HttpRequest, *args, **kwargs):
+        return self.sync_view(request, *args, **kwargs)
+
+
+class CategoryList(AsyncReadView):
+    sync_view_class = views.CategoryList
+
+    @conditionalResponseAsync('categories')
+    @cacheResponseAsync('categories')
+    async def get(self, request: HttpRequest) -> JsonResponse:
+        categories = CategorySerializer.setupQuerySet(Category.objects.all())
+        categories = [category async for category in categories]
+        serialized_categories = CategorySerializer(categories, many=True).data
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={'categories': serialized_categories}
+        )
+        return makeJsonResponse(response_data, 200)
+
+
+class CategoryDetail(AsyncReadView):
+    sync_view_class = views.CategoryDetail
+
+    @conditionalResponseAsync('categories')
+    @cacheResponseAsync('categories')
+    async def get(self, request: HttpRequest, category_slug: str) -> JsonResponse:
+        try:
+            category = await CategorySerializer.setupQuerySet(Category.objects.all()).aget(slug=category_slug)
+        except Category.DoesNotExist:
+            return makeNotFoundResponse()
+
+        serialized_category = CategorySerializer(category).data
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={'category': serialized_category}
+        )
+        return makeJsonResponse(response_data, 200)
+
+
+class ProductList(AsyncReadView):
+    sync_view_class = views.ProductList
+
+    async def get(self, request: HttpRequest) -> JsonResponse:
+        # Offset pages are kept for old clients only and are served by the sync view
+        if request.GET.get('offset'):
+            return await sync_to_async(self.handleSyncRequest)(request)
+        return await self.getCursorPage(request)
+
+    @conditionalResponseAsync('products')
+    @cacheResponseAsync('products')
+    async def getCursorPage(self, request: HttpRequest) -> JsonResponse:
+        try:
+            page = ProductListPageScheme(**request.GET.dict())
+            cursor = decodeCursor(page.cursor) if page.cursor else None
+        except ValidationError as e:
+            return makeErrorResponse(400, 'Page validation error', e.errors())
+        except ValueError:
+            return makeErrorResponse(400, 'Cursor must be a valid cursor string')
+
+        sync_view = self.sync_view_class()
+        products = ProductSerializer.setupQuerySet(sync_view.filterProducts(page))
+        try:
+            products, next_cursor, prev_cursor = await paginateByCursorAsync(
+                products, sync_view.orderings[page.ordering], cursor, page.limit
+            )
+        except (ValueError, DjangoValidationError):
+            return makeErrorResponse(400, 'Cursor does not match the product list')
+
+        serialized_products = ProductSerializer(products, many=True).data
+
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={'products': serialized_products, 'next': next_cursor, 'prev': prev_cursor}
+        )
+        return makeJsonResponse(response_data, 200)
+
+
+class ProductDetail(AsyncReadView):
+    sync_view_class = views.ProductDetail
+
+    @conditionalResponseAsync('products', object_kwarg='product_slug')
+    @cacheResponseAsync('products', object_kwarg='product_slug')
+    async def get(self, request: HttpRequest, product_slug: str) -> JsonResponse:
+        try:
+            product = await ProductSerializer.setupQuerySet(Product.objects.all()).aget(slug=product_slug)
+        except Product.DoesNotExist:
+            return makeNotFoundResponse()
+
+        serialized_product = ProductSerializer(product).data
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={'product': serialized_product}
+        )
+        return makeJsonResponse(response_data, 200)
+
+
+class OrderList(AsyncReadView):
+    sync_view_class = views.OrderList
+
+    @conditionalResponseAsync('orders')
+    async def get(self, request: HttpRequest) -> JsonResponse:
+        try:
+            page = OrderListPageScheme(**request.GET.dict())
+            cursor = decodeCursor(page.cursor) if page.cursor else None
+        except ValidationError as e:
+            return makeErrorResponse(400, 'Page validation error', e.errors())
+        except ValueError:
+            return makeErrorResponse(400, 'Cursor must be a valid cursor string')
+
+        sync_view = self.sync_view_class()
+        orders = sync_view.filterOrders(page)
+
+        if page.page is not None:
+            orders_page = [order async for order in sync_view.getNumberedPage(orders, page)]
+            next_cursor = prev_cursor = None
+        else:
+            try:
+                orders_page, next_cursor, prev_cursor = await paginateByCursorAsync(
+                    orders, sync_view.ordering, cursor, page.limit
+                )
+            except (ValueError, DjangoValidationError):
+                return makeErrorResponse(400, 'Cursor does not match the order list')
+
+        orders_count = await orders.acount() if page.count else None
+
+        status_counts = None
+        if page.status_counts:
+            status_counts = {row['status']: row['count'] async for row in sync_view.countStatuses(orders)}
+
+        serialized_orders = OrderSerializer(orders_page, many=True).data
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={
+                'orders': serialized_orders,
+                'count': orders_count,
+                'status_counts': status_counts,
+                'next': next_cursor,
+                'prev': prev_cursor,
+            }
+        )
+        return makeJsonResponse(response_data, 200)
+
+
+class OrderDetail(AsyncReadView):
+    sync_view_class = views.OrderDetail
+
+    @conditionalResponseAsync('orders')
+    async def get(self, request: HttpRequest, order_id: str) -> JsonResponse:
+        try:
+            order_id = uuid.UUID(order_id).hex
+            # Products ids are prefetched, the serializer must not query the database on the event loop
+            order = await OrderSerializer.setupQuerySet(Order.objects.all()).aget(id=order_id)
+        except (ValueError, Order.DoesNotExist):
+            return makeNotFoundResponse()
+
+        serialized_order = OrderSerializer(order).data
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={'order': serialized_order}
+        )
+        return makeJsonResponse(response_data, 200)
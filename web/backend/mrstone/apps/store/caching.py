@@ -0,0 +1,335 @@
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+from cache import Cache, AsyncCache, HOUR_SECONDS
+from mrstone.routers import usePrimaryDatabase
+
+import json
+import time
+import hashlib
+import functools
+from urllib.parse import urlencode
+
+
+RESPONSE_CACHE_EXPIRE = HOUR_SECONDS
+
+CACHE_HITS_KEY = 'store:cache:hits'
+CACHE_MISSES_KEY = 'store:cache:misses'
+
+# Namespaces of cached data, each of them is invalidated separately
+NAMESPACES = ('categories', 'products', 'orders')
+
+
+def getNamespaceVersionKey(namespace: str) -> str:
+    return f'store:version:{namespace}'
+
+
+def getNamespaceModifiedKey(namespace: str) -> str:
+    return f'store:modified:{namespace}'
+
+
+def getNamespaceScope(namespace: str, object_key: str | None = None) -> str:
+    """Returns the part of the namespace which is invalidated when only some of its objects change:
+    responses of the object itself or lists, which can contain any of the objects.
+    """
+
+    if object_key is None:
+        return f'{namespace}:lists'
+    return f'{namespace}:object:{object_key}'
+
+
+def getNamespaceState(cache: Cache, namespace: str, request: Request = None, object_key: str = None) -> tuple[str, int | None]:
+    """Returns the version of the namespace scope and the timestamp of its last change.
+    The state is fetched once per request and shared by the response decorators.
+    """
+
+    scope = getNamespaceScope(namespace, object_key)
+    namespaces_states = getattr(request, 'namespaces_states', None) if request else None
+    if namespaces_states and scope in namespaces_states:
+        return namespaces_states[scope]
+
+    values = cache.getValues(makeNamespaceStateKeys(namespace, scope))
+    return saveNamespaceState(request, scope, *values)
+
+
+async def getNamespaceStateAsync(cache: AsyncCache, namespace: str, request=None, object_key: str = None) -> tuple[str, int | None]:
+    "Async version of `getNamespaceState`."
+
+    scope = getNamespaceScope(namespace, object_key)
+    namespaces_states = getattr(request, 'namespaces_states', None) if request else None
+    if namespaces_states and scope in namespaces_states:
+        return namespaces_states[scope]
+
+    values = await cache.getValues(makeNamespaceStateKeys(namespace, scope))
+    return saveNamespaceState(request, scope, *values)
+
+
+def makeNamespaceStateKeys(namespace: str, scope: str) -> list[str]:
+    return [
+        getNamespaceVersionKey(namespace), getNamespaceModifiedKey(namespace),
+        getNamespaceVersionKey(scope), getNamespaceModifiedKey(scope),
+    ]
+
+
+def saveNamespaceState(
+    request, scope: str, version: str | None, modified_at: str | None, scope_version: str | None, scope_modified_at: str | None
+) -> tuple[str, int | None]:
+    # The scope is invalidated with the whole namespace too, so both versions identify the responses
+    modified_at = max((int(value) for value in (modified_at, scope_modified_at) if value), default=None)
+    state = (f'{version or 0}.{scope_version or 0}', modified_at)
+
+    if request is not None:
+        namespaces_states = getattr(request, 'namespaces_states', None)
+        if namespaces_states is None:
+            namespaces_states = request.namespaces_states = {}
+        namespaces_states[scope] = state
+
+    return state
+
+
+def invalidateNamespace(*namespaces: str) -> None:
+    """Invalidates all the cached responses of the namespaces.
+
+    Instead of searching and deleting the keys, the namespace version is incremented,
+    so old entries are no longer requested and expire by themselves.
+    """
+
+    incrementVersions(namespaces)
+
+
+def invalidateNamespaceObjects(namespace: str, objects_keys: list[str]) -> None:
+    "Invalidates cached lists of the namespace and responses of the objects, responses of other objects stay cached."
+
+    incrementVersions([getNamespaceScope(namespace)] + [getNamespaceScope(namespace, key) for key in objects_keys])
+
+
+def incrementVersions(namespaces: list[str]) -> None:
+    cache = Cache()
+    modified_at = str(int(time.time()))
+    for namespace in namespaces:
+        cache.incrementValue(getNamespaceVersionKey(namespace))
+        cache.setValue(getNamespaceModifiedKey(namespace), modified_at, expire=None)
+
+
+def invalidateOnChange(*namespaces: str) -> None:
+    "Invalidates the namespaces after the data was changed in the current transaction."
+
+    # The second invalidation after commit drops entries which
+    # concurrent requests could cache before the new data became visible
+    invalidateNamespace(*namespaces)
+    transaction.on_commit(lambda: invalidateNamespace(*namespaces))
+
+
+def invalidateObjectsOnChange(namespace: str, objects_keys: list[str]) -> None:
+    "Invalidates the objects of the namespace after they were changed in the current transaction, see `invalidateOnChange`."
+
+    objects_keys = list(objects_keys)
+    invalidateNamespaceObjects(namespace, objects_keys)
+    transaction.on_commit(lambda: invalidateNamespaceObjects(namespace, objects_keys))
+
+
+def readRecentChangesFromPrimary(modified_at: int | None) -> None:
+    """Keeps reads of a namespace which has just changed on the primary database.
+    A lagging replica could return the old data, which would be cached or tagged with the new namespace version.
+    """
+
+    # The modification time has seconds precision
+    if modified_at and time.time() - modified_at <= settings.DB_REPLICA_PRIMARY_PIN_SECONDS + 1:
+        usePrimaryDatabase()
+
+
+def makeRequestHash(request: Request) -> str:
+    "Identifies the request by the endpoint and the query params."
+
+    # `GET` is shared by DRF and plain Django requests of async views
+    query_params = urlencode(sorted(request.GET.lists()), doseq=True)
+    return hashlib.sha1(f'{request.path}?{query_params}'.encode('utf-8')).hexdigest()
+
+
+def makeResponseCacheKey(cache: Cache, namespace: str, request: Request, object_key: str = None) -> str:
+    "Makes a cache key of the response based on the namespace version, the endpoint and the query params."
+
+    version, modified_at = getNamespaceState(cache, namespace, request, object_key)
+    return f'store:response:{namespace}:{version}:{makeRequestHash(request)}'
+
+
+async def makeResponseCacheKeyAsync(cache: AsyncCache, namespace: str, request, object_key: str = None) -> str:
+    "Async version of `makeResponseCacheKey`, sync and async views share the cached responses."
+
+    version, modified_at = await getNamespaceStateAsync(cache, namespace, request, object_key)
+    return f'store:response:{namespace}:{version}:{makeRequestHash(request)}'
+
+
+def makeResponseETag(namespace: str, version: str, request: Request) -> str:
+    return f'"{namespace}-{version}-{makeRequestHash(request)}"'
+
+
+def setValidatorHeaders(response, etag: str, modified_at: int | None) -> None:
+    response['ETag'] = etag
+    if modified_at:
+        response['Last-Modified'] = http_date(modified_at)
+
+
+def isNotModified(request: Request, etag: str, modified_at: int | None) -> bool:
+    "Checks the request validators against the current state of the response."
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        client_etags = [value.strip().removeprefix('W/') for value in if_none_match.split(',')]
+        return '*' in client_etags or etag in client_etags
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE') or '')
+    if if_modified_since and modified_at:
+        return modified_at <= if_modified_since
+
+    return False
+
+
+def getCacheStats() -> dict:
+    "Returns the number of response cache hits and misses and the hit ratio."
+
+    cache = Cache()
+    hits = int(cache.getValue(CACHE_HITS_KEY) or 0)
+    misses = int(cache.getValue(CACHE_MISSES_KEY) or 0)
+    requests_count = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / requests_count if requests_count else None,
+    }
+
+
+def cacheResponse(namespace: str, expire: int = RESPONSE_CACHE_EXPIRE, object_kwarg: str = None):
+    """Caches successful responses of the view method until the namespace is invalidated.
+
+    :param namespace: namespace of the data which is used in the response.
+    :param expire: cache entry lifetime in seconds.
+    :param object_kwarg: view argument which identifies the object of a detail response,
+    such responses are invalidated only with their object, see `invalidateNamespaceObjects`.
+    """
+
+    def container(view_func):
+        @functools.wraps(view_func)
+        def wrapper(*args, **kwargs):
+            request = args[1]
+
+            object_key = kwargs.get(object_kwarg) if object_kwarg else None
+
+            cache = Cache()
+            cache_key = makeResponseCacheKey(cache, namespace, request, object_key)
+            cached_response_data = cache.getValue(cache_key)
+            if cached_response_data is not None:
+                cache.incrementValue(CACHE_HITS_KEY)
+                return Response(json.loads(cached_response_data), status=200)
+
+            cache.incrementValue(CACHE_MISSES_KEY)
+            version, modified_at = getNamespaceState(cache, namespace, request, object_key)
+            readRecentChangesFromPrimary(modified_at)
+            response = view_func(*args, **kwargs)
+            if response.status_code == 200:
+                cache.setValue(cache_key, json.dumps(response.data, cls=JSONEncoder), expire=expire)
+            return response
+        return wrapper
+    return container
+
+
+def conditionalResponse(namespace: str, object_kwarg: str = None):
+    """Adds `ETag` and `Last-Modified` headers, derived from the namespace version, to responses of the view method.
+    Requests with matching `If-None-Match` or `If-Modified-Since` get 304 without calling the view.
+
+    :param namespace: namespace of the data which is used in the response.
+    :param object_kwarg: view argument which identifies the object of a detail response.
+    """
+
+    def container(view_func):
+        @functools.wraps(view_func)
+        def wrapper(*args, **kwargs):
+            request = args[1]
+
+            object_key = kwargs.get(object_kwarg) if object_kwarg else None
+
+            version, modified_at = getNamespaceState(Cache(), namespace, request, object_key)
+            etag = makeResponseETag(namespace, version, request)
+
+            if isNotModified(request, etag, modified_at):
+                response = Response(status=304)
+            else:
+                readRecentChangesFromPrimary(modified_at)
+                response = view_func(*args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            setValidatorHeaders(response, etag, modified_at)
+            return response
+        return wrapper
+    return container
+
+
+def cacheResponseAsync(namespace: str, expire: int = RESPONSE_CACHE_EXPIRE, object_kwarg: str = None):
+    """Async version of `cacheResponse` for async views which return JSON responses.
+
+    :param namespace: namespace of the data which is used in the response.
+    :param expire: cache entry lifetime in seconds.
+    :param object_kwarg: view argument which identifies the object of a detail response.
+    """
+
+    def container(view_func):
+        @functools.wraps(view_func)
+        async def wrapper(*args, **kwargs):
+            request = args[1]
+
+            object_key = kwargs.get(object_kwarg) if object_kwarg else None
+
+            cache = AsyncCache()
+            cache_key = await makeResponseCacheKeyAsync(cache, namespace, request, object_key)
+            cached_response_data = await cache.getValue(cache_key)
+            if cached_response_data is not None:
+                await cache.incrementValue(CACHE_HITS_KEY)
+                return HttpResponse(cached_response_data, content_type='application/json', status=200)
+
+            await cache.incrementValue(CACHE_MISSES_KEY)
+            version, modified_at = await getNamespaceStateAsync(cache, namespace, request, object_key)
+            readRecentChangesFromPrimary(modified_at)
+            response = await view_func(*args, **kwargs)
+            if response.status_code == 200:
+                await cache.setValue(cache_key, response.content.decode('utf-8'), expire=expire)
+            return response
+        return wrapper
+    return container
+
+
+def conditionalResponseAsync(namespace: str, object_kwarg: str = None):
+    """Async version of `conditionalResponse`.
+
+    :param namespace: namespace of the data which is used in the response.
+    :param object_kwarg: view argument which identifies the object of a detail response.
+    """
+
+    def container(view_func):
+        @functools.wraps(view_func)
+        async def wrapper(*args, **kwargs):
+            request = args[1]
+
+            object_key = kwargs.get(object_kwarg) if object_kwarg else None
+
+            version, modified_at = await getNamespaceStateAsync(AsyncCache(), namespace, request, object_key)
+            etag = makeResponseETag(namespace, version, request)
+
+            if isNotModified(request, etag, modified_at):
+                response = HttpResponse(status=304)
+            else:
+                readRecentChangesFromPrimary(modified_at)
+                response = await view_func(*args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            setValidatorHeaders(response, etag, modified_at)
+            return response
+        return wrapper
+    return container
@@ -0,0 +1,45 @@
+from django.db import transaction
+
+import logs
+from cache import Cache
+
+import json
+import traceback
+from datetime import datetime
+
+
+# Redis stream of order events which is read by the bot
+ORDER_EVENTS_STREAM = 'store:events:orders'
+ORDER_EVENTS_STREAM_MAX_LENGTH = 100_000
+
+
+def makeOrderStatusEvent(order_id, status: str, contact: str, contact_type: str, changed_at: datetime) -> dict:
+    return {
+        'type': 'order_status_changed',
+        'order_id': str(order_id),
+        'status': status,
+        'contact': contact,
+        'contact_type': contact_type,
+        'changed_at': changed_at.isoformat(),
+    }
+
+
+def publishOrderEvents(events: list[dict]) -> None:
+    "Writes the events to the order events stream, a failure is logged and doesn't break the request."
+
+    try:
+        Cache().addStreamEntries(ORDER_EVENTS_STREAM, events, max_length=ORDER_EVENTS_STREAM_MAX_LENGTH)
+    except Exception:
+        logs.addLog(
+            level='error',
+            message='Order events were not published.',
+            details=f'{traceback.format_exc()}\n\nEvents: {json.dumps(events)}',
+            send_telegram_message=True,
+        )
+
+
+def publishOrderEventsOnCommit(events: list[dict]) -> None:
+    "Publishes the events after the current transaction is committed, so rolled back changes are never announced."
+
+    if events:
+        transaction.on_commit(lambda: publishOrderEvents(events))
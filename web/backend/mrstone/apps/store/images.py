@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+import logs
+
+from PIL import Image, ImageOps
+
+import os
+import functools
+import traceback
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+
+# Widths of the product image variants
+PRODUCT_IMAGE_VARIANTS = {
+    'thumbnail': 200,
+    'card': 600,
+    'full': 1600,
+}
+PRODUCT_IMAGE_QUALITY = 90
+
+executor = None
+
+
+def getExecutor() -> ProcessPoolExecutor:
+    "Returns the pool of processes which encode images, it's created on the first use."
+
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(
+            max_workers=settings.PRODUCT_IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return executor
+
+
+def makeImageVariants(image_name: str, media_root: str, variants: dict) -> dict:
+    """
+    Encodes WEBP variants of the image, runs in a worker process.
+    Returns storage names of the variants.
+
+    :param image_name: storage name of the original image.
+    :param media_root: directory of the media storage.
+    :param variants: variants names and their max widths.
+    """
+
+    image_base_name = os.path.splitext(image_name)[0]
+    variants_names = {}
+
+    with Image.open(os.path.join(media_root, image_name)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        for variant, width in variants.items():
+            variant_image = image
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                variant_image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+            variant_name = f'{image_base_name}-{variant}.webp'
+            variant_image.save(os.path.join(media_root, variant_name), 'WEBP', quality=PRODUCT_IMAGE_QUALITY)
+            variants_names[variant] = variant_name
+
+    return variants_names
+
+
+def saveImageVariants(product_image_id: int, future: Future) -> None:
+    "Records the variants made by the worker on the product image."
+
+    from apps.store.models import ProductImage
+
+    try:
+        variants = future.result()
+    except Exception:
+        logs.addLog(level='error', message=traceback.format_exc(), send_telegram_message=True)
+        return
+
+    # Callbacks run in the executor thread which has its own connection
+    try:
+        ProductImage.objects.filter(id=product_image_id).update(variants=variants)
+    finally:
+        connection.close()
+
+
+def scheduleProductImageVariants(product_image) -> None:
+    "Makes variants of the uploaded product image in the worker pool after the transaction is committed."
+
+    product_image_id = product_image.id
+    image_name = product_image.image.name
+
+    def submit() -> None:
+        future = getExecutor().submit(
+            makeImageVariants, image_name, str(settings.MEDIA_ROOT), PRODUCT_IMAGE_VARIANTS
+        )
+        future.add_done_callback(functools.partial(saveImageVariants, product_image_id))
+
+    transaction.on_commit(submit)
@@ -0,0 +1,200 @@
+from django.db import transaction
+from django.db.utils import IntegrityError
+from django.utils.text import slugify
+
+from apps.store.models import Category, Product
+from apps.store.schemas import ProductImportScheme
+from apps.store.caching import invalidateOnChange
+
+import csv
+import json
+import codecs
+import itertools
+from typing import Iterable, Iterator
+from pydantic import ValidationError
+
+
+PRODUCT_IMPORT_CHUNK_SIZE = 1000
+
+# Only the first errors are reported, the rest are counted
+PRODUCT_IMPORT_MAX_ERRORS = 1000
+
+PRODUCT_IMPORT_FORMATS = ('csv', 'jsonl')
+
+PRODUCT_IMPORT_UPDATE_FIELDS = ['title', 'description', 'category', 'price', 'available_quantity']
+
+
+def readCSVRows(lines: Iterable[str]) -> Iterator[tuple[int, dict | None, str | None]]:
+    "Yields row numbers and rows of the CSV file, the first line contains field names."
+
+    for row_number, row in enumerate(csv.DictReader(lines), start=1):
+        # Empty CSV values are treated as missing fields
+        yield row_number, {k: v for k, v in row.items() if k and v not in ('', None)}, None
+
+
+def readJSONLRows(lines: Iterable[str]) -> Iterator[tuple[int, dict | None, str | None]]:
+    "Yields row numbers and rows of the JSON Lines file, invalid rows are yielded with an error."
+
+    for row_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            row = json.loads(line)
+        except json.decoder.JSONDecodeError:
+            yield row_number, None, 'Row must be a valid JSON string'
+            continue
+
+        if not isinstance(row, dict):
+            yield row_number, None, 'Row must be a JSON object'
+            continue
+
+        yield row_number, row, None
+
+
+def readProductRows(stream: Iterable[bytes], file_format: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """Decodes the byte lines stream lazily and yields the rows.
+
+    :param stream: iterable of byte lines (file, uploaded file, request).
+    :param file_format: `csv` or `jsonl`.
+    """
+
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    match file_format:
+        case 'csv': return reportReadingError(readCSVRows(lines))
+        case 'jsonl': return reportReadingError(readJSONLRows(lines))
+    raise ValueError(f'Unknown import format: {file_format}')
+
+
+def reportReadingError(rows: Iterator[tuple[int, dict | None, str | None]]) -> Iterator[tuple[int, dict | None, str | None]]:
+    "Yields the error of a file which can't be read further as the error of the next row, the rest of the file is skipped."
+
+    row_number = 0
+    try:
+        for row_number, row, error in rows:
+            yield row_number, row, error
+    except UnicodeDecodeError:
+        yield row_number + 1, None, 'File must be UTF-8 encoded, the rest of the file was not imported'
+    except csv.Error as e:
+        yield row_number + 1, None, f'Row must be a valid CSV row ({e}), the rest of the file was not imported'
+
+
+class ProductImportReport:
+    def __init__(self) -> None:
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.errors_count = 0
+
+    def addError(self, row_number: int, details) -> None:
+        self.errors_count += 1
+        if len(self.errors) < PRODUCT_IMPORT_MAX_ERRORS:
+            self.errors.append({'row': row_number, 'details': details})
+
+    def asDict(self) -> dict:
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'errors_count': self.errors_count,
+            'errors': self.errors,
+        }
+
+
+def importProducts(rows: Iterable[tuple[int, dict | None, str | None]], chunk_size: int = PRODUCT_IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Validates rows in chunks and inserts new products or updates existing ones by slug.
+    Invalid rows are reported without aborting the import, memory usage depends only on the chunk size.
+
+    :param rows: row numbers, rows and reading errors, see `readProductRows`.
+    :param chunk_size: number of rows which are validated and written together.
+    """
+
+    report = ProductImportReport()
+
+    rows = iter(rows)
+    try:
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            importProductsChunk(chunk, report)
+    finally:
+        # Bulk queries don't send model signals, chunks saved before a failure have changed products too
+        invalidateOnChange('products')
+
+    return report.asDict()
+
+
+def importProductsChunk(chunk: list, report: ProductImportReport) -> None:
+    "Validates and saves the chunk, its errors are reported in the order of rows."
+
+    errors = {}
+    products = {}
+    for row_number, row, error in chunk:
+        if error:
+            errors[row_number] = error
+            continue
+
+        try:
+            product_data = ProductImportScheme(**row)
+        except ValidationError as e:
+            errors[row_number] = e.errors(include_url=False, include_context=False)
+            continue
+
+        slug = slugify(product_data.title, allow_unicode=True)
+        if not slug:
+            errors[row_number] = 'Title must contain letters or digits'
+            continue
+
+        # The last row wins if the chunk contains the same product several times
+        products[slug] = (row_number, product_data)
+
+    # Check all the categories of the chunk with one query
+    categories_ids = {product_data.category for _, product_data in products.values() if product_data.category}
+    existing_categories_ids = set(
+        Category.objects.filter(id__in=categories_ids).values_list('id', flat=True)
+    )
+
+    products_to_save = []
+    for slug, (row_number, product_data) in list(products.items()):
+        if product_data.category and product_data.category not in existing_categories_ids:
+            errors[row_number] = f'Category {product_data.category} does not exist'
+            del products[slug]
+            continue
+
+        products_to_save.append(
+            Product(
+                slug=slug,
+                title=product_data.title,
+                description=product_data.description,
+                category_id=product_data.category,
+                price=product_data.price,
+                available_quantity=product_data.available_quantity,
+            )
+        )
+
+    if products_to_save:
+        saveProductsChunk(products, products_to_save, report, errors)
+
+    for row_number in sorted(errors):
+        report.addError(row_number, errors[row_number])
+
+
+def saveProductsChunk(products: dict, products_to_save: list[Product], report: ProductImportReport, errors: dict) -> None:
+    existing_slugs = set(
+        Product.objects.filter(slug__in=products.keys()).values_list('slug', flat=True)
+    )
+
+    try:
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products_to_save,
+                update_conflicts=True,
+                unique_fields=['slug'],
+                update_fields=PRODUCT_IMPORT_UPDATE_FIELDS,
+            )
+    except IntegrityError as e:
+        for row_number, _ in products.values():
+            errors[row_number] = f'Chunk was not saved: {e}'
+        return
+
+    report.updated += len(existing_slugs)
+    report.created += len(products_to_save) - len(existing_slugs)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.store.importing import (
+    PRODUCT_IMPORT_CHUNK_SIZE, PRODUCT_IMPORT_FORMATS, readProductRows, importProducts
+)
+
+import json
+
+
+class Command(BaseCommand):
+    help = 'Imports products from a CSV or JSON Lines file, existing products are updated by slug.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the import file.')
+        parser.add_argument(
+            '--format', choices=PRODUCT_IMPORT_FORMATS, dest='file_format',
+            help='File format, by default it is taken from the file extension.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=PRODUCT_IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in PRODUCT_IMPORT_FORMATS:
+            raise CommandError('Import file must be CSV or JSON Lines, use --format to set it.')
+
+        try:
+            with open(path, 'rb') as file:
+                report = importProducts(readProductRows(file, file_format), chunk_size=options['chunk_size'])
+        except OSError as e:
+            raise CommandError(f'Import file was not read: {e}')
+
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=4))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:00
+
+import apps.store.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_order'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(blank=True, upload_to=apps.store.utils.getProductImageLocation),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Russian stems match whole words in any form, simple lexemes match prefixes of typed words
+SEARCH_VECTOR_SQL = '''
+    setweight(to_tsvector('russian', coalesce({row}title, '')), 'A')
+    || setweight(to_tsvector('simple', coalesce({row}title, '')), 'A')
+    || setweight(to_tsvector('russian', coalesce({row}description, '')), 'B')
+    || setweight(to_tsvector('simple', coalesce({row}description, '')), 'B')
+'''
+
+CREATE_TRIGGER_SQL = f'''
+    CREATE FUNCTION products_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER products_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, search_vector ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector_update();
+
+    UPDATE products SET search_vector = {SEARCH_VECTOR_SQL.format(row='')};
+'''
+
+DROP_TRIGGER_SQL = '''
+    DROP TRIGGER IF EXISTS products_search_vector_trigger ON products;
+    DROP FUNCTION IF EXISTS products_search_vector_update();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_productimage_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='products_search_vector_idx'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
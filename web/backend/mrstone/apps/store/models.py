@@ -1,8 +1,13 @@
-from django.db import models
+from django.db import models, connection
+from django.db.models import Q, F, Case, When, Value, Count
+from django.utils import timezone
 from django.utils.text import slugify
+from django.contrib.postgres.search import SearchVectorField
+from django.contrib.postgres.indexes import GinIndex
 from django_resized import ResizedImageField
 
 from apps.store import utils
+from apps.store.events import makeOrderStatusEvent, publishOrderEventsOnCommit
 
 import uuid
 
@@ -39,9 +44,17 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     available_quantity = models.IntegerField(default=0, blank=True)
+    # Maintained by the database trigger from the title and the description
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         db_table = 'products'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='products_search_vector_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='products_category_price_idx'),
+            models.Index(fields=['price', 'id'], name='products_price_idx'),
+            models.Index(fields=['available_quantity'], name='products_available_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.title, allow_unicode=True)
@@ -50,22 +63,81 @@ class Product(models.Model):
     def __str__(self):
         return self.title
 
+    @classmethod
+    def reserveStock(cls, quantities: dict[int, int]) -> None:
+        """Decreases available quantities of the products with one conditional update,
+        so concurrent orders don't wait for each other's row locks before the check.
+        Raises `OutOfStockError` if any product doesn't have enough items, the caller must roll back the transaction.
+
+        :param quantities: required quantities by products ids.
+        """
+
+        if not quantities:
+            return
+
+        condition = Q()
+        for product_id, quantity in quantities.items():
+            condition |= Q(pk=product_id, available_quantity__gte=quantity)
+
+        reserved_quantity = Case(
+            *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+            output_field=models.IntegerField(),
+        )
+        updated_count = cls.objects.filter(condition).update(
+            available_quantity=F('available_quantity') - reserved_quantity
+        )
+
+        if updated_count != len(quantities):
+            raise OutOfStockError
+
+    @classmethod
+    def releaseStock(cls, quantities: dict[int, int]) -> None:
+        """Returns reserved quantities of the products back to the stock with one update.
+
+        :param quantities: released quantities by products ids.
+        """
+
+        if not quantities:
+            return
+
+        released_quantity = Case(
+            *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+            output_field=models.IntegerField(),
+        )
+        cls.objects.filter(pk__in=quantities.keys()).update(
+            available_quantity=F('available_quantity') + released_quantity
+        )
+
+
+class OutOfStockError(Exception):
+    pass
+
 
 class ProductImage(models.Model):
     id = models.BigAutoField(primary_key=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    image = ResizedImageField(
-        upload_to=utils.getProductImageLocation,
-        force_format='WEBP',
-        quality=90,
-        blank=True
-    )
+    image = models.ImageField(upload_to=utils.getProductImageLocation, blank=True)
+    variants = models.JSONField(default=dict, blank=True)
 
     class Meta:
         db_table = 'product_images'
 
 
 class Order(models.Model):
+    # Statuses which the order can be moved to from each status
+    status_transitions = {
+        'created': ('in_progress', 'cancelled', 'rejected'),
+        'in_progress': ('in_delivery', 'cancelled'),
+        'in_delivery': ('completed', 'cancelled'),
+        'completed': (),
+        'cancelled': (),
+        'rejected': (),
+    }
+    # Products of orders in these statuses are reserved, see `Product.reserveStock`
+    reserving_statuses = ('created', 'in_progress', 'in_delivery')
+    # Reserved products return to the stock when the order is moved to these statuses
+    releasing_statuses = ('cancelled', 'rejected')
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     products = models.ManyToManyField(Product)
     contact = models.CharField(max_length=100)
@@ -76,5 +148,90 @@ class Order(models.Model):
 
     class Meta:
         db_table = 'orders'
+        # Both indexes end with the list ordering fields, so filtered pages are read from the index in order
+        indexes = [
+            models.Index(fields=['contact_type', 'contact', 'created_at', 'id'], name='orders_contact_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='orders_status_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status which is stored in the database, its changes are published by the `post_save` signal
+        instance.loaded_status = instance.__dict__.get('status')
+        return instance
+
+    @classmethod
+    def getSourceStatuses(cls, status: str) -> list[str]:
+        "Returns statuses from which the order can be moved to the status."
+        return [source for source, targets in cls.status_transitions.items() if status in targets]
+
+    @classmethod
+    def releaseProducts(cls, orders_ids: list[uuid.UUID]) -> list[str]:
+        """Returns products of the orders back to the stock, every product is reserved once per order.
+        Returns slugs of the released products.
+        """
+
+        products_counts = (
+            cls.products.through.objects.filter(order_id__in=orders_ids)
+            .values('product_id', 'product__slug')
+            .annotate(count=Count('id'))
+        )
+        quantities = {}
+        products_slugs = []
+        for row in products_counts:
+            quantities[row['product_id']] = row['count']
+            products_slugs.append(row['product__slug'])
+
+        Product.releaseStock(quantities)
+        return products_slugs
+
+    def updateReservedProducts(self, products: list[Product] | None, status: str) -> list[str]:
+        """Reserves products which are added to the order and releases removed ones, before the order is saved.
+        Products of cancelled and rejected orders aren't reserved, moving to these statuses releases them on save.
+        Raises `OutOfStockError`, the caller must roll back the transaction.
+        Returns slugs of the changed products.
+        """
+
+        if products is None or self.status in self.releasing_statuses or status in self.releasing_statuses:
+            return []
+
+        reserved_ids = set(self.products.values_list('id', flat=True))
+        added_products = [product for product in products if product.id not in reserved_ids]
+        removed_ids = reserved_ids - {product.id for product in products}
+
+        Product.reserveStock({product.id: 1 for product in added_products})
+        Product.releaseStock({product_id: 1 for product_id in removed_ids})
+
+        removed_slugs = []
+        if removed_ids:
+            removed_slugs = list(Product.objects.filter(id__in=removed_ids).values_list('slug', flat=True))
+        return [product.slug for product in added_products] + removed_slugs
+
+    @classmethod
+    def changeStatuses(cls, orders_ids: list[uuid.UUID], status: str) -> list[uuid.UUID]:
+        """Moves the orders to the status with one query, orders with disallowed transitions are skipped.
+        Status events of the changed orders are published after commit.
+        Returns ids of the changed orders.
+        """
+
+        source_statuses = cls.getSourceStatuses(status)
+        if not orders_ids or not source_statuses:
+            return []
+
+        changed_at = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {cls._meta.db_table} SET status = %s, updated_at = %s '
+                + 'WHERE id = ANY(%s) AND status = ANY(%s) RETURNING id, contact, contact_type',
+                [status, changed_at, list(orders_ids), source_statuses]
+            )
+            rows = cursor.fetchall()
+
+        publishOrderEventsOnCommit([
+            makeOrderStatusEvent(order_id, status, contact, contact_type, changed_at)
+            for order_id, contact, contact_type in rows
+        ])
+        return [order_id for order_id, contact, contact_type in rows]
 
 
@@ -1,6 +1,95 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator, field_validator
+from pydantic_core import PydanticCustomError
+
+import re
+import uuid
+from datetime import date
+from decimal import Decimal
+from typing import Literal
+
+
+OrderStatus = Literal['created', 'in_progress', 'in_delivery', 'completed', 'cancelled', 'rejected']
 
 
 class ProductListOffsetScheme(BaseModel):
     start: int
     end: int
+
+
+class CursorPageScheme(BaseModel):
+    cursor: str | None = None
+    limit: int = Field(default=5, ge=1, le=100)
+
+
+class ProductListPageScheme(CursorPageScheme):
+    category: int | None = None
+    price_min: Decimal | None = Field(default=None, ge=0)
+    price_max: Decimal | None = Field(default=None, ge=0)
+    available: bool | None = None
+    ordering: Literal['id', 'price', '-price'] = 'id'
+
+
+class OrderListFilterScheme(BaseModel):
+    contact: str | None = Field(default=None, max_length=100)
+    contact_type: str | None = Field(default=None, max_length=30)
+    status: OrderStatus | None = None
+    # Inclusive ranges of days, passed as `YYYY-MM-DD:YYYY-MM-DD`
+    created_at: tuple[date, date] | None = None
+    updated_at: tuple[date, date] | None = None
+
+    @model_validator(mode='before')
+    @classmethod
+    def dropEmptyFilters(cls, data):
+        # Empty query params mean that the filter isn't used
+        if isinstance(data, dict):
+            return {key: value for key, value in data.items() if value != ''}
+        return data
+
+    @field_validator('created_at', 'updated_at', mode='before')
+    @classmethod
+    def parseDateRange(cls, value):
+        if not isinstance(value, str):
+            return value
+
+        if not re.fullmatch(r'\d{4}-\d{2}-\d{2}:\d{4}-\d{2}-\d{2}', value):
+            raise PydanticCustomError('date_range', 'Date range must be in YYYY-MM-DD:YYYY-MM-DD format')
+        try:
+            date_from, date_to = (date.fromisoformat(part) for part in value.split(':'))
+        except ValueError:
+            raise PydanticCustomError('date_range', 'Date range contains an invalid date')
+        if date_from > date_to:
+            raise PydanticCustomError('date_range', 'Date range must not end before it starts')
+        return date_from, date_to
+
+
+class OrderListPageScheme(OrderListFilterScheme, CursorPageScheme):
+    limit: int = Field(default=20, ge=1, le=100)
+    count: bool = True
+    # Page number for clients which jump between pages, cursors are preferred for long lists
+    page: int | None = Field(default=None, ge=1, le=1000)
+    status_counts: bool = False
+
+    @model_validator(mode='after')
+    def checkPagination(self):
+        if self.page is not None and self.cursor:
+            # Custom error has no exception object in its context, so the error details stay serializable
+            raise PydanticCustomError('pagination', 'Page number and cursor cannot be used together')
+        return self
+
+
+class ProductSearchScheme(BaseModel):
+    q: str = Field(min_length=1, max_length=100)
+    limit: int = Field(default=10, ge=1, le=50)
+
+
+class ProductImportScheme(BaseModel):
+    title: str = Field(min_length=1, max_length=50)
+    description: str | None = None
+    category: int | None = None
+    price: Decimal = Field(ge=0, max_digits=10, decimal_places=2)
+    available_quantity: int = 0
+
+
+class OrderStatusBulkScheme(BaseModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+    status: str
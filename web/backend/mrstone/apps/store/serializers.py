@@ -1,14 +1,60 @@
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from django.db.models import QuerySet, Prefetch
+from django.core.exceptions import ValidationError as DjangoValidationError
 
 from apps.store.models import Category, Product, ProductImage, Order
 
 
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    "Validates all the primary keys with one query instead of a query per item."
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child_relation = self.child_relation
+        pk_field = child_relation.get_queryset().model._meta.pk
+
+        pks = []
+        for pk in data:
+            try:
+                pks.append(pk_field.to_python(pk))
+            except DjangoValidationError:
+                child_relation.fail('incorrect_type', data_type=type(pk).__name__)
+
+        objects = child_relation.get_queryset().in_bulk(set(pks))
+        for pk in pks:
+            if pk not in objects:
+                child_relation.fail('does_not_exist', pk_value=pk)
+
+        return [objects[pk] for pk in pks]
+
+
+class BatchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'slug', 'title', 'description', 'image']
         read_only_fields = ['id', 'slug']
 
+    @classmethod
+    def setupQuerySet(cls, queryset: QuerySet) -> QuerySet:
+        "Loads only the fields which are used by the serializer."
+        return queryset.only(*cls.Meta.fields)
+
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,16 +62,36 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = ['id', 'slug', 'title', 'description', 'category', 'price', 'available_quantity']
         read_only_fields = ['id', 'slug']
 
+    @classmethod
+    def setupQuerySet(cls, queryset: QuerySet) -> QuerySet:
+        "Loads only the fields which are used by the serializer, `category` is rendered from its id."
+        return queryset.only(*cls.Meta.fields)
+
 
 class ProductImage(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
-        fields = ['id', 'product', 'image']
-        read_only_fields = ['id', 'slug']
+        fields = ['id', 'product', 'image', 'variants']
+        read_only_fields = ['id', 'variants']
 
 
 class OrderSerializer(serializers.ModelSerializer):
+    products = BatchedPrimaryKeyRelatedField(many=True, queryset=Product.objects.all())
+
     class Meta:
         model = Order
         fields = ['id', 'products', 'contact', 'contact_type', 'status', 'updated_at', 'created_at']
         read_only_fields = ['id']
+
+    @classmethod
+    def setupQuerySet(cls, queryset: QuerySet) -> QuerySet:
+        "Loads products ids of all the orders with one extra query instead of a query per order."
+        return queryset.prefetch_related(
+            Prefetch('products', queryset=Product.objects.only('id'))
+        )
+
+    def validate_products(self, products: list[Product]) -> list[Product]:
+        # The order stores every product once, so it reserves one item of each
+        if len({product.id for product in products}) != len(products):
+            raise serializers.ValidationError('Products must not repeat.')
+        return products
@@ -0,0 +1,48 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from apps.store.models import Category, Product, ProductImage, Order
+from apps.store.caching import invalidateOnChange, invalidateObjectsOnChange
+from apps.store.events import makeOrderStatusEvent, publishOrderEventsOnCommit
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidateCategories(sender, **kwargs) -> None:
+    invalidateOnChange('categories')
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidateProducts(sender, **kwargs) -> None:
+    invalidateOnChange('products')
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidateOrders(sender, **kwargs) -> None:
+    invalidateOnChange('orders')
+
+
+@receiver(post_save, sender=Order)
+def handleOrderStatusChange(sender, instance: Order, created: bool, **kwargs) -> None:
+    loaded_status = getattr(instance, 'loaded_status', None)
+    instance.loaded_status = instance.status
+    if created or loaded_status is None or loaded_status == instance.status:
+        return
+
+    if loaded_status in Order.reserving_statuses and instance.status in Order.releasing_statuses:
+        # The stock update query doesn't send model signals
+        invalidateObjectsOnChange('products', Order.releaseProducts([instance.id]))
+
+    publishOrderEventsOnCommit([
+        makeOrderStatusEvent(
+            instance.id, instance.status, instance.contact, instance.contact_type, instance.updated_at
+        )
+    ])
+
+
+@receiver(pre_delete, sender=Order)
+def releaseDeletedOrderProducts(sender, instance: Order, **kwargs) -> None:
+    # Products of the order are still linked to it before the deletion
+    if instance.status in Order.reserving_statuses:
+        invalidateObjectsOnChange('products', Order.releaseProducts([instance.id]))
@@ -1,17 +1,40 @@
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIClient
 
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
 from django.utils.text import slugify
+from asgiref.sync import sync_to_async
 
 from apps.auth.models import User, AuthToken
 from apps.auth.utils import hashAuthToken
-from apps.store.models import Category, Product, Order
+from apps.auth.access import createAuthToken
+from apps.store.models import Category, Product, ProductImage, Order
 from apps.store.serializers import CategorySerializer, ProductSerializer, OrderSerializer
+from apps.store import views, importing
+from apps.store.schemas import ProductListPageScheme
+from apps.store.caching import NAMESPACES, CACHE_HITS_KEY, invalidateNamespace
+from apps.store.events import ORDER_EVENTS_STREAM
+from apps.store.images import PRODUCT_IMAGE_VARIANTS, getExecutor, makeImageVariants, scheduleProductImageVariants
 
+from cache import Cache
+from utils import encodeCursor, decodeCursor
+
+import os
+import csv
+import json
+import time
 import uuid
+import tempfile
 from io import BytesIO
+from datetime import timedelta
+from contextlib import contextmanager
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
 
@@ -23,7 +46,36 @@ def getTestImage():
     return SimpleUploadedFile(f"test-{image_id}.jpg", bts.getvalue())
 
 
-class CategoryTests(APITestCase):
+class QueriesCountMixin:
+    @contextmanager
+    def assertMaxNumQueries(self, number: int):
+        "Fails if the block executes more than `number` database queries."
+
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        executed_queries = [query['sql'] for query in context.captured_queries]
+        self.assertLessEqual(
+            len(executed_queries), number,
+            f'{len(executed_queries)} queries executed, {number} expected at most:\n' + '\n'.join(executed_queries)
+        )
+
+
+# All the test requests come from one address within the rate limit window,
+# so the tests get a limit which isn't reached and doesn't delay requests
+high_rate_limit = override_settings(RATE_LIMIT_DELAY_LEVELS=({'limit': 100_000, 'delay': 0},))
+
+
+class ResponseCacheMixin:
+    "Drops responses cached by previous test runs, since the test database is recreated."
+
+    def setUp(self):
+        super().setUp()
+        invalidateNamespace(*NAMESPACES)
+
+
+@high_rate_limit
+class CategoryTests(ResponseCacheMixin, APITestCase):
     def testCategoryCreation(self):
         url = reverse('category_list')
 
@@ -123,7 +175,8 @@ class CategoryTests(APITestCase):
    
         
 
-class ProductTests(APITestCase):
+@high_rate_limit
+class ProductTests(ResponseCacheMixin, QueriesCountMixin, APITestCase):
     def testProductCreation(self):
         category = Category.objects.create(title='Living room decorations')
 
@@ -242,14 +295,258 @@ class ProductTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
-class OrderTests(APITestCase):
+    def testProductListCursorPagination(self):
+        category = Category.objects.create(title='Garden')
+
+        products_to_create = []
+        for i in range(12):
+            products_to_create.append(
+                Product(slug=f'test-{i}', title=f"Test product {i}", category=category, price=1000*i)
+            )
+        products = Product.objects.bulk_create(products_to_create)
+        product_ids = sorted(product.id for product in products)
+
+        url = reverse('product_list')
+
+        # Walk forward through all pages
+        received_ids = []
+        pages = []
+        cursor = None
+        while True:
+            data = {'limit': 5, 'cursor': cursor} if cursor else {'limit': 5}
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            details = response.json()['details']
+            received_ids.extend(product['id'] for product in details['products'])
+            pages.append(details)
+            cursor = details['next']
+            if not cursor:
+                break
+
+        self.assertEqual(received_ids, product_ids)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['prev'])
+
+        # Go back from the last page
+        response = self.client.get(url, {'limit': 5, 'cursor': pages[-1]['prev']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        details = response.json()['details']
+        self.assertEqual([product['id'] for product in details['products']], product_ids[5:10])
+        self.assertIsNotNone(details['next'])
+
+        # Invalid cursor
+        response = self.client.get(url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Cursor values which can't be compared with fields
+        cursor = decodeCursor(pages[0]['next'])
+        for value in ([1], {'id': 1}):
+            cursor['values'][0] = value
+            response = self.client.get(url, {'limit': 5, 'cursor': encodeCursor(cursor)})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def testProductResponseCache(self):
+        category = Category.objects.create(title='Yard')
+        product = Product.objects.create(title='Stone bench', category=category, price=7000)
+
+        url = reverse('product_detail', kwargs={'product_slug': product.slug})
+        cache = Cache()
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        hits_count = int(cache.getValue(CACHE_HITS_KEY) or 0)
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(int(cache.getValue(CACHE_HITS_KEY)), hits_count + 1)
+        self.assertEqual(response.json()['details']['product']['price'], '7000.00')
+
+        # Saving the product invalidates cached responses
+        product.price = 8000
+        product.save()
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.json()['details']['product']['price'], '8000.00')
+
+
+    def testProductListQueriesCount(self):
+        category = Category.objects.create(title='Terrace')
+
+        products_to_create = []
+        for i in range(50):
+            products_to_create.append(
+                Product(slug=f'test-{i}', title=f"Test product {i}", category=category, price=1000*i)
+            )
+        Product.objects.bulk_create(products_to_create)
+
+        # Only the page query, reads don't run in a transaction
+        with self.assertMaxNumQueries(1):
+            response = self.client.get(reverse('product_list'), {'limit': 50})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['details']['products']), 50)
+
+
+    def testProductConditionalGet(self):
+        category = Category.objects.create(title='Patio')
+        product = Product.objects.create(title='Stone planter', category=category, price=4000)
+
+        url = reverse('product_detail', kwargs={'product_slug': product.slug})
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Changed product gets a new ETag
+        product.available_quantity = 5
+        product.save()
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+    def testProductListFiltering(self):
+        garden = Category.objects.create(title='Garden decorations')
+        kitchen = Category.objects.create(title='Kitchen accessories')
+
+        products_to_create = []
+        for i in range(10):
+            products_to_create.append(
+                Product(
+                    slug=f'test-{i}', title=f"Test product {i}", category=garden if i % 2 else kitchen,
+                    price=1000*i, available_quantity=i % 3
+                )
+            )
+        Product.objects.bulk_create(products_to_create)
+
+        url = reverse('product_list')
+        data = {'category': garden.pk, 'price_min': 2000, 'price_max': 8000, 'available': 'true', 'ordering': '-price'}
+
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        products = response.json()['details']['products']
+        # Garden products 3, 5, 7 are in the price range, product 3 is out of stock
+        self.assertEqual([product['title'] for product in products], ['Test product 7', 'Test product 5'])
+
+        # Cursor of one ordering can't be used with another one
+        response = self.client.get(url, {'limit': 2, 'ordering': 'price'})
+        next_cursor = response.json()['details']['next']
+        response = self.client.get(url, {'limit': 2, 'ordering': 'id', 'cursor': next_cursor})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def testProductListFilteringUsesIndexes(self):
+        category = Category.objects.create(title='Balcony')
+        view = views.ProductList()
+
+        combinations = [
+            {'ordering': 'price'},
+            {'ordering': '-price'},
+            {'category': category.pk},
+            {'category': category.pk, 'ordering': 'price'},
+            {'category': category.pk, 'price_min': 1000, 'price_max': 5000, 'ordering': '-price'},
+            {'price_min': 1000, 'ordering': 'price'},
+            {'available': True},
+            {'available': True, 'category': category.pk},
+        ]
+
+        with connection.cursor() as cursor:
+            # Small test tables are cheaper to scan, so only the plans without any usable index keep seq scans
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        for params in combinations:
+            page = ProductListPageScheme(**params)
+            products = view.filterProducts(page).order_by(*view.orderings[page.ordering])[:page.limit + 1]
+            plan = products.explain()
+            self.assertNotIn('Seq Scan', plan, f'{params}:\n{plan}')
+
+
+    def testProductSearch(self):
+        Product.objects.create(title='Каменная ваза', description='Ваза для цветов ручной работы', price=5000)
+        Product.objects.create(title='Бетонная скамейка', description='Садовая скамейка', price=9000)
+        Product.objects.create(title='Подставка', description='Подставка из камня для ваз', price=1000)
+
+        url = reverse('product_search')
+
+        # Prefix of the typed word
+        response = self.client.get(url, {'q': 'Каменн'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        titles = [product['title'] for product in response.json()['details']['products']]
+        self.assertEqual(titles, ['Каменная ваза'])
+
+        # Title matches are ranked higher than description matches
+        response = self.client.get(url, {'q': 'ваза'})
+        titles = [product['title'] for product in response.json()['details']['products']]
+        self.assertEqual(titles, ['Каменная ваза', 'Подставка'])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def testProductImport(self):
+        category = Category.objects.create(title='Outdoor')
+        Product.objects.create(title='Garden lamp', category=category, price=1000)
+
+        rows = [
+            {'title': 'Garden lamp', 'category': category.pk, 'price': 1500, 'available_quantity': 3},
+            {'title': 'Stone bowl', 'price': '250.50'},
+            {'title': 'Stone table', 'category': category.pk + 1000, 'price': 100},
+            {'title': 'Stone chair', 'price': -1},
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\n{invalid json'
+
+        plain_auth_token = str(uuid.uuid4())
+        auth_token_hash, auth_token_salt_hex = hashAuthToken(plain_auth_token)
+        user = User.objects.create(name='test_user')
+        AuthToken.objects.create(
+            user=user, token_hash=auth_token_hash, salt_hex=auth_token_salt_hex
+        )
+        auth_header = f'Bearer {plain_auth_token}'
+
+        url = reverse('product_import')
+        response = self.client.post(url, body, content_type='application/x-ndjson', HTTP_AUTHORIZATION=auth_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        report = response.json()['details']['import']
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['updated'], 1)
+        self.assertEqual(report['errors_count'], 3)
+        self.assertEqual([error['row'] for error in report['errors']], [3, 4, 5])
+
+        product = Product.objects.get(slug=slugify('Garden lamp', allow_unicode=True))
+        self.assertEqual(product.price, 1500)
+        self.assertEqual(product.available_quantity, 3)
+        self.assertTrue(Product.objects.filter(title='Stone bowl').exists())
+
+        # The rows before an undecodable line are imported, the line is reported
+        body = json.dumps({'title': 'Stone vase', 'price': 300}).encode('utf-8') + b'\n\xff\xfe{"title": "Stone cup"}\n'
+        response = self.client.post(url, body, content_type='application/x-ndjson', HTTP_AUTHORIZATION=auth_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        report = response.json()['details']['import']
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([error['row'] for error in report['errors']], [2])
+
+        # CSV which can't be parsed is reported instead of failing the request
+        body = 'title,price\n' + 'x' * (csv.field_size_limit() + 1) + ',100\n'
+        response = self.client.post(url, body, content_type='text/csv', HTTP_AUTHORIZATION=auth_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['details']['import']['errors_count'], 1)
+
+
+@high_rate_limit
+class OrderTests(ResponseCacheMixin, QueriesCountMixin, APITestCase):
     def testOrderCreation(self):
         category = Category.objects.create(title='Home')
 
         products_to_create = []
         for i in range(5):
             products_to_create.append(
-                Product(slug=f'test-{i}', title=f"Test product {i}", category=category, price=1000*i)
+                Product(
+                    slug=f'test-{i}', title=f"Test product {i}", category=category, price=1000*i, available_quantity=1
+                )
             )
         products = Product.objects.bulk_create(products_to_create)
 
@@ -264,6 +561,118 @@ class OrderTests(APITestCase):
         response = self.client.post(url, data, format='multipart') 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+        # Ordered products are reserved
+        available_quantities = set(Product.objects.values_list('available_quantity', flat=True))
+        self.assertEqual(available_quantities, {0})
+
+        response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Order.objects.count(), 1)
+
+        # Products are validated with one query
+        data['products'] = [product.id for product in products] + [products[-1].id + 1000]
+        response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def testOrderStockRelease(self):
+        products = Product.objects.bulk_create([
+            Product(slug=f'test-{i}', title=f'Test product {i}', price=1000, available_quantity=2) for i in range(3)
+        ])
+        ordered_product, other_product = products[0], products[1]
+
+        user = User.objects.create(name='test_user')
+        plain_auth_token = createAuthToken(user)
+        auth_header = f'Bearer {plain_auth_token}'
+
+        def getProductETag(product: Product) -> str:
+            return self.client.get(reverse('product_detail', kwargs={'product_slug': product.slug}))['ETag']
+
+        def getAvailableQuantity(product: Product) -> int:
+            product.refresh_from_db()
+            return product.available_quantity
+
+        url = reverse('order_list')
+        data = {'products': [ordered_product.id], 'contact': '@NotSilaev', 'contact_type': 'telegram'}
+
+        # Repeated products would reserve more items than the order stores
+        response = self.client.post(url, {**data, 'products': [ordered_product.id] * 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Only the ordered product is invalidated
+        ordered_product_etag = getProductETag(ordered_product)
+        other_product_etag = getProductETag(other_product)
+
+        cancelled_order_id = self.client.post(url, data, format='json').json()['details']['order']['id']
+        deleted_order_id = self.client.post(url, data, format='json').json()['details']['order']['id']
+        self.assertEqual(getAvailableQuantity(ordered_product), 0)
+
+        self.assertNotEqual(getProductETag(ordered_product), ordered_product_etag)
+        self.assertEqual(getProductETag(other_product), other_product_etag)
+
+        # Cancelled and deleted orders return their products to the stock
+        response = self.client.post(
+            reverse('order_status_bulk'), {'ids': [cancelled_order_id], 'status': 'cancelled'},
+            format='json', HTTP_AUTHORIZATION=auth_header
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(getAvailableQuantity(ordered_product), 1)
+
+        response = self.client.delete(
+            reverse('order_detail', kwargs={'order_id': deleted_order_id}), HTTP_AUTHORIZATION=auth_header
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(getAvailableQuantity(ordered_product), 2)
+
+        # Products of an order which was already cancelled aren't released again
+        Order.objects.get(id=cancelled_order_id).delete()
+        self.assertEqual(getAvailableQuantity(ordered_product), 2)
+
+
+    def testOrderEditingReservesStock(self):
+        products = Product.objects.bulk_create([
+            Product(slug=f'test-{i}', title=f'Test product {i}', price=1000, available_quantity=1) for i in range(3)
+        ])
+
+        user = User.objects.create(name='test_user')
+        plain_auth_token = createAuthToken(user)
+        auth_header = f'Bearer {plain_auth_token}'
+
+        def getAvailableQuantities() -> list[int]:
+            return [Product.objects.get(id=product.id).available_quantity for product in products]
+
+        data = {'products': [products[0].id], 'contact': '@NotSilaev', 'contact_type': 'telegram'}
+        order_id = self.client.post(reverse('order_list'), data, format='json').json()['details']['order']['id']
+        url = reverse('order_detail', kwargs={'order_id': order_id})
+        self.assertEqual(getAvailableQuantities(), [0, 1, 1])
+
+        # Added products are reserved and removed ones are released
+        response = self.client.patch(
+            url, {'products': [products[1].id, products[2].id]}, format='json', HTTP_AUTHORIZATION=auth_header
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(getAvailableQuantities(), [1, 0, 0])
+
+        # Products which are out of stock can't be added
+        Product.objects.filter(id=products[0].id).update(available_quantity=0)
+        response = self.client.patch(
+            url, {'products': [product.id for product in products]}, format='json', HTTP_AUTHORIZATION=auth_header
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(getAvailableQuantities(), [0, 0, 0])
+        self.assertEqual(Order.objects.get(id=order_id).products.count(), 2)
+
+        # Cancelling releases the products, the order can't become active again without a new reservation
+        response = self.client.patch(url, {'status': 'cancelled'}, format='json', HTTP_AUTHORIZATION=auth_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(getAvailableQuantities(), [0, 1, 1])
+
+        for order_status in ('created', 'in_progress', 'lost'):
+            response = self.client.patch(url, {'status': order_status}, format='json', HTTP_AUTHORIZATION=auth_header)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.get(id=order_id).status, 'cancelled')
+        self.assertEqual(getAvailableQuantities(), [0, 1, 1])
+
 
     def testOrderEditing(self):
         category = Category.objects.create(title='Home')
@@ -349,3 +758,385 @@ class OrderTests(APITestCase):
         # Try to get deleted product
         response = self.client.get(url, format='json')     
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def testOrderListPagination(self):
+        category = Category.objects.create(title='Home')
+        product = Product.objects.create(title='Test product', category=category, price=1000)
+
+        for i in range(7):
+            order = Order.objects.create(contact='@NotSilaev', contact_type='telegram')
+            order.products.add(product)
+        Order.objects.create(contact='+7 999 888 77 66', contact_type='phone_number')
+
+        url = reverse('order_list')
+        data = {'contact': '@NotSilaev', 'contact_type': 'telegram', 'limit': 5}
+
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        details = response.json()['details']
+        self.assertEqual(len(details['orders']), 5)
+        self.assertEqual(details['count'], 7)
+
+        created_at_values = [order['created_at'] for order in details['orders']]
+        self.assertEqual(created_at_values, sorted(created_at_values, reverse=True))
+
+        response = self.client.get(url, {**data, 'cursor': details['next'], 'count': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        details = response.json()['details']
+        self.assertEqual(len(details['orders']), 2)
+        self.assertIsNone(details['count'])
+        self.assertIsNone(details['next'])
+
+        # Page size is capped
+        response = self.client.get(url, {'limit': 1000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def testOrderListNumberedPages(self):
+        for i in range(7):
+            Order.objects.create(contact='@NotSilaev', contact_type='telegram')
+        for i in range(2):
+            Order.objects.create(contact='@NotSilaev', contact_type='telegram', status='completed')
+
+        url = reverse('order_list')
+        data = {'contact': '@NotSilaev', 'contact_type': 'telegram', 'limit': 5, 'status_counts': 'true'}
+
+        response = self.client.get(url, {**data, 'page': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        details = response.json()['details']
+        self.assertEqual(len(details['orders']), 5)
+        self.assertEqual(details['count'], 9)
+        self.assertEqual(details['status_counts'], {'created': 7, 'completed': 2})
+        first_page_ids = {order['id'] for order in details['orders']}
+
+        response = self.client.get(url, {**data, 'page': 2})
+        details = response.json()['details']
+        self.assertEqual(len(details['orders']), 4)
+        self.assertFalse(first_page_ids & {order['id'] for order in details['orders']})
+
+        # Page number and cursor are exclusive
+        response = self.client.get(url, {**data, 'page': 2, 'cursor': 'cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def testOrderListQueriesCount(self):
+        category = Category.objects.create(title='Home')
+
+        products_to_create = []
+        for i in range(5):
+            products_to_create.append(
+                Product(slug=f'test-{i}', title=f"Test product {i}", category=category, price=1000*i)
+            )
+        products = Product.objects.bulk_create(products_to_create)
+
+        for i in range(30):
+            order = Order.objects.create(contact='@NotSilaev', contact_type='telegram')
+            order.products.set(products)
+
+        # Page query, products prefetch and count
+        with self.assertMaxNumQueries(3):
+            response = self.client.get(reverse('order_list'), {'limit': 30})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        orders = response.json()['details']['orders']
+        self.assertEqual(len(orders), 30)
+        self.assertEqual(len(orders[0]['products']), 5)
+
+
+    def testOrderStatusBulkChange(self):
+        created_orders = [
+            Order.objects.create(contact='@NotSilaev', contact_type='telegram') for i in range(2)
+        ]
+        completed_order = Order.objects.create(contact='@NotSilaev', contact_type='telegram', status='completed')
+
+        user = User.objects.create(name='test_user')
+        plain_auth_token = createAuthToken(user)
+        auth_header = f'Bearer {plain_auth_token}'
+
+        url = reverse('order_status_bulk')
+        data = {
+            'ids': [str(order.id) for order in created_orders + [completed_order]],
+            'status': 'in_progress',
+        }
+
+        # Request with incorrect auth token
+        response = self.client.post(url, data, format='json', HTTP_AUTHORIZATION=auth_header + 'extra_chars')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # Request with correct auth token: token lookup, one update and savepoints of the atomic request
+        with self.assertMaxNumQueries(4):
+            response = self.client.post(url, data, format='json', HTTP_AUTHORIZATION=auth_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        details = response.json()['details']
+        self.assertEqual(sorted(details['changed']), sorted(str(order.id) for order in created_orders))
+        self.assertEqual(details['skipped'], [str(completed_order.id)])
+
+        statuses = set(Order.objects.filter(id__in=[order.id for order in created_orders]).values_list('status', flat=True))
+        self.assertEqual(statuses, {'in_progress'})
+
+        # Unknown status
+        response = self.client.post(url, {**data, 'status': 'lost'}, format='json', HTTP_AUTHORIZATION=auth_header)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def testOrderStatusEvents(self):
+        bulk_order = Order.objects.create(contact='NotSilaev', contact_type='telegram')
+        saved_order = Order.objects.create(contact='NotSilaev', contact_type='telegram')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.changeStatuses([bulk_order.id], 'in_progress')
+
+            order = Order.objects.get(id=saved_order.id)
+            order.status = 'cancelled'
+            order.save()
+            # Saving without a status change isn't announced
+            order.contact = 'NotSilaev2'
+            order.save()
+
+        orders_ids = {str(bulk_order.id), str(saved_order.id)}
+        entries = Cache().redis_client.xrevrange(ORDER_EVENTS_STREAM, count=100)
+        events = [
+            {key.decode(): value.decode() for key, value in fields.items()} for entry_id, fields in entries
+        ]
+        events = [event for event in events if event['order_id'] in orders_ids]
+
+        self.assertEqual(
+            sorted((event['order_id'], event['status']) for event in events),
+            sorted([(str(bulk_order.id), 'in_progress'), (str(saved_order.id), 'cancelled')])
+        )
+
+
+    def testOrderListFiltering(self):
+        for order_status in ('created', 'created', 'in_progress', 'completed'):
+            Order.objects.create(contact='@NotSilaev', contact_type='telegram', status=order_status)
+        old_order = Order.objects.create(contact='@NotSilaev', contact_type='telegram', status='created')
+        Order.objects.filter(id=old_order.id).update(created_at=timezone.now() - timedelta(days=30))
+
+        url = reverse('order_list')
+        today = timezone.now().strftime('%Y-%m-%d')
+
+        response = self.client.get(url, {'contact': '@NotSilaev', 'contact_type': 'telegram', 'status': 'created'})
+        self.assertEqual(response.json()['details']['count'], 3)
+
+        response = self.client.get(url, {'status': 'created', 'created_at': f'{today}:{today}'})
+        self.assertEqual(response.json()['details']['count'], 2)
+
+        # Malformed filters are rejected instead of failing in the query
+        malformed_filters = [
+            {'created_at': '2026-01-01T10:00:00'},
+            {'created_at': 'a:b:c'},
+            {'created_at': today},
+            {'created_at': '2026-13-01:2026-13-02'},
+            {'updated_at': '2026-02-01:2026-01-01'},
+            {'status': 'lost'},
+        ]
+        for filters in malformed_filters:
+            response = self.client.get(url, filters)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, filters)
+            self.assertEqual(response.json()['errors'][0]['status'], 400)
+
+
+    def testOrderListFilteringUsesIndexes(self):
+        combinations = [
+            {'contact': '@NotSilaev', 'contact_type': 'telegram'},
+            {'contact': '@NotSilaev', 'contact_type': 'telegram', 'created_at__gte': timezone.now()},
+            {'status': 'created'},
+            {'status': 'created', 'created_at__gte': timezone.now()},
+        ]
+
+        with connection.cursor() as cursor:
+            # Small test tables are cheaper to scan, so only the plans without any usable index keep seq scans
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        for filter_kwargs in combinations:
+            orders = Order.objects.filter(**filter_kwargs).order_by(*views.OrderList.ordering)[:21]
+            plan = orders.explain()
+            self.assertNotIn('Seq Scan', plan, f'{filter_kwargs}:\n{plan}')
+            self.assertNotIn('Sort', plan, f'{filter_kwargs}:\n{plan}')
+
+
+@high_rate_limit
+class OrderStockTests(TransactionTestCase):
+    def testParallelOrdersDoNotOversell(self):
+        product = Product.objects.create(title='Limited vase', price=1000, available_quantity=10)
+        url = reverse('order_list')
+
+        def createOrder(i: int) -> int:
+            client = APIClient()
+            data = {'products': [product.id], 'contact': f'@customer_{i}', 'contact_type': 'telegram'}
+            try:
+                response = client.post(url, data, format='json')
+                return response.status_code
+            finally:
+                connection.close()
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            statuses = list(executor.map(createOrder, range(50)))
+        elapsed_time = time.perf_counter() - started_at
+
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 10)
+        self.assertEqual(statuses.count(status.HTTP_409_CONFLICT), 40)
+
+        product.refresh_from_db()
+        self.assertEqual(product.available_quantity, 0)
+        self.assertEqual(Order.objects.count(), 10)
+
+        # Orders don't serialize on a product lock for long, 50 checkouts take well under a second per order
+        self.assertLess(elapsed_time, 10)
+
+
+@high_rate_limit
+class ProductImportTests(TransactionTestCase):
+    def testChunksAreCommittedSeparately(self):
+        user = User.objects.create(name='test_user')
+        auth_header = f'Bearer {createAuthToken(user)}'
+
+        in_atomic_block = []
+        save_products_chunk = importing.saveProductsChunk
+
+        def saveProductsChunk(*args, **kwargs):
+            in_atomic_block.append(connection.in_atomic_block)
+            return save_products_chunk(*args, **kwargs)
+
+        rows = [{'title': f'Stone bowl {i}', 'price': 100} for i in range(3)]
+        body = '\n'.join(json.dumps(row) for row in rows)
+        with mock.patch('apps.store.importing.saveProductsChunk', side_effect=saveProductsChunk):
+            response = self.client.post(
+                reverse('product_import'), body, content_type='application/x-ndjson', HTTP_AUTHORIZATION=auth_header
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['details']['import']['created'], 3)
+
+        # Neither the request nor the view wraps the import, a chunk lock is released when the chunk is saved
+        self.assertEqual(in_atomic_block, [False])
+
+
+@high_rate_limit
+@override_settings(ROOT_URLCONF='mrstone.async_urls')
+class AsyncStoreTests(ResponseCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.category = Category.objects.create(title='Garden')
+        products_to_create = []
+        for i in range(7):
+            products_to_create.append(
+                Product(
+                    slug=f'test-{i}', title=f"Test product {i}", category=self.category,
+                    price=1000*i, available_quantity=1
+                )
+            )
+        self.products = Product.objects.bulk_create(products_to_create)
+
+
+    async def testAsyncProductListMatchesSyncView(self):
+        url = reverse('product_list')
+
+        async_response = await self.async_client.get(url, {'limit': 5, 'ordering': '-price'})
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+
+        # The sync view must not get the response cached by the async one
+        await sync_to_async(invalidateNamespace)('products')
+        with override_settings(ROOT_URLCONF='mrstone.urls'):
+            sync_response = await self.async_client.get(url, {'limit': 5, 'ordering': '-price'})
+        self.assertEqual(sync_response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(async_response.json(), sync_response.json())
+
+        next_cursor = async_response.json()['details']['next']
+        response = await self.async_client.get(url, {'limit': 5, 'ordering': '-price', 'cursor': next_cursor})
+        self.assertEqual(len(response.json()['details']['products']), 2)
+
+
+    async def testAsyncConditionalGet(self):
+        url = reverse('product_detail', kwargs={'product_slug': self.products[0].slug})
+
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = await self.async_client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await self.async_client.get(reverse('product_detail', kwargs={'product_slug': 'missing'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    async def testAsyncOrderViews(self):
+        url = reverse('order_list')
+
+        # Writes are handled by the sync view
+        data = {
+            'products': [self.products[0].id, self.products[1].id],
+            'contact': '+7 999 888 77 66',
+            'contact_type': 'phone_number'
+        }
+        response = await self.async_client.post(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order_id = response.json()['details']['order']['id']
+
+        response = await self.async_client.get(url, {'contact': data['contact']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        details = response.json()['details']
+        self.assertEqual(details['count'], 1)
+        self.assertEqual(sorted(details['orders'][0]['products']), sorted(data['products']))
+
+        response = await self.async_client.get(reverse('order_detail', kwargs={'order_id': order_id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['details']['order']['id'], order_id)
+
+
+class ProductImageTests(TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        media_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(media_directory.cleanup)
+        self.media_root = media_directory.name
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+    def testImageVariants(self):
+        os.makedirs(os.path.join(self.media_root, 'store'))
+        # Palette images are converted, the large image is scaled down to every variant
+        Image.new('P', (2000, 1000)).save(os.path.join(self.media_root, 'store/large.png'))
+        Image.new('RGB', (300, 150)).save(os.path.join(self.media_root, 'store/small.jpg'))
+
+        # Variants are encoded in the worker process
+        variants = getExecutor().submit(
+            makeImageVariants, 'store/large.png', self.media_root, PRODUCT_IMAGE_VARIANTS
+        ).result(timeout=60)
+        self.assertEqual(set(variants), set(PRODUCT_IMAGE_VARIANTS))
+
+        for variant, width in PRODUCT_IMAGE_VARIANTS.items():
+            self.assertEqual(variants[variant], f'store/large-{variant}.webp')
+            with Image.open(os.path.join(self.media_root, variants[variant])) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.size, (width, width // 2))
+
+        # Small images aren't scaled up, only variants narrower than the image are scaled down
+        variants = makeImageVariants('store/small.jpg', self.media_root, PRODUCT_IMAGE_VARIANTS)
+        for variant, width in PRODUCT_IMAGE_VARIANTS.items():
+            with Image.open(os.path.join(self.media_root, variants[variant])) as image:
+                self.assertEqual(image.size, (min(width, 300), min(width, 300) // 2))
+
+
+    def testProductImageVariantsAreSaved(self):
+        product = Product.objects.create(title='Concrete vase', price=1000)
+        product_image = ProductImage.objects.create(product=product, image=getTestImage())
+
+        # The pool thread runs the variants and the callback which saves them, shutdown waits for both
+        executor = ThreadPoolExecutor(max_workers=1)
+        with mock.patch('apps.store.images.getExecutor', return_value=executor):
+            scheduleProductImageVariants(product_image)
+        executor.shutdown(wait=True)
+
+        product_image.refresh_from_db()
+        self.assertEqual(set(product_image.variants), set(PRODUCT_IMAGE_VARIANTS))
+        for variant_name in product_image.variants.values():
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, variant_name)))
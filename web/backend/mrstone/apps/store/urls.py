@@ -7,7 +7,10 @@ urlpatterns = [
     path('products/categories/', views.CategoryList.as_view(), name='category_list'),
     path('products/categories/<str:category_slug>/', views.CategoryDetail.as_view(), name='category_detail'),
     path('products/', views.ProductList.as_view(), name='product_list'),
+    path('products/search/', views.ProductSearch.as_view(), name='product_search'),
+    path('products/import/', views.ProductImport.as_view(), name='product_import'),
     path('products/<str:product_slug>/', views.ProductDetail.as_view(), name='product_detail'),
     path('orders/', views.OrderList.as_view(), name='order_list'),
+    path('orders/status/', views.OrderStatusBulk.as_view(), name='order_status_bulk'),
     path('orders/<str:order_id>/', views.OrderDetail.as_view(), name='order_detail'),
 ]
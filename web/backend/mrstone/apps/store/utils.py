@@ -1,5 +1,6 @@
 from django.db import models
 
+import os
 import typing
 import uuid
 
@@ -14,5 +15,6 @@ def getCategoryImageLocation(instance: Category, filename: str) -> str:
     
 def getProductImageLocation(instance: ProductImage, filename: str) -> str:
     image_id = uuid.uuid4()
-    image_location = f'store/products/{instance.product.slug}/{image_id}.webp'
+    image_extension = os.path.splitext(filename)[1].lower()
+    image_location = f'store/products/{instance.product.slug}/{image_id}{image_extension}'
     return image_location
@@ -1,29 +1,65 @@
 from rest_framework.views import APIView
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser
 from rest_framework import status
 
 from django.http import Http404
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db.utils import IntegrityError
 from django.utils.text import slugify
 from django.db import transaction
+from django.utils import timezone
+from django.db.models import F, Count, QuerySet
+from django.contrib.postgres.search import SearchQuery, SearchRank
 
-from utils import makeResponseData, makeModelFilterKwargs
+from utils import makeResponseData, decodeCursor, paginateByCursor
 
 from apps.auth.access import checkAuthToken
-from apps.store.models import Category, Product, ProductImage, Order
+from apps.store.models import Category, Product, ProductImage, Order, OutOfStockError
 from apps.store.serializers import CategorySerializer, ProductSerializer, OrderSerializer
-from apps.store.schemas import ProductListOffsetScheme
-
+from apps.store.caching import cacheResponse, conditionalResponse, invalidateOnChange, invalidateObjectsOnChange
+from apps.store.images import scheduleProductImageVariants
+from apps.store.importing import PRODUCT_IMPORT_FORMATS, readProductRows, importProducts
+from apps.store.schemas import (
+    ProductListOffsetScheme, ProductListPageScheme, OrderListFilterScheme, OrderListPageScheme, OrderStatusBulkScheme,
+    ProductSearchScheme,
+)
+
+import re
 import json
 import uuid
+from datetime import datetime, time
 from pydantic import ValidationError
 
 
-class CategoryList(APIView):
+class NonAtomicRequestsMixin:
+    "Opts the view out of the request transaction, the view manages transactions itself."
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return transaction.non_atomic_requests(super().as_view(**initkwargs))
+
+
+class AtomicWritesMixin(NonAtomicRequestsMixin):
+    """
+    Opts the view out of the request transaction and runs only unsafe methods in a transaction,
+    so reads don't pay for BEGIN/COMMIT and writes keep being atomic.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class CategoryList(AtomicWritesMixin, APIView):
+    @conditionalResponse('categories')
+    @cacheResponse('categories')
     def get(self, request: Request) -> Response:
-        categories = Category.objects.all()
+        categories = CategorySerializer.setupQuerySet(Category.objects.all())
         serialized_categories = CategorySerializer(categories, many=True).data
         response_data = makeResponseData(
             status=200,
@@ -45,13 +81,15 @@ class CategoryList(APIView):
             return Response(response_data, status=status.HTTP_201_CREATED)
 
 
-class CategoryDetail(APIView):
+class CategoryDetail(AtomicWritesMixin, APIView):
     def getObject(self, category_slug: str) -> Category:
         try:
             return Category.objects.get(slug=category_slug)
         except Category.DoesNotExist:
             raise Http404
 
+    @conditionalResponse('categories')
+    @cacheResponse('categories')
     def get(self, request: Request, category_slug: str) -> Response:
         category = self.getObject(category_slug)
         serialized_category = CategorySerializer(category).data
@@ -83,27 +121,88 @@ class CategoryDetail(APIView):
         return Response(response_data, status=status.HTTP_204_NO_CONTENT)
 
 
-class ProductList(APIView):
+class ProductList(AtomicWritesMixin, APIView):
+    # Keyset orderings, each of them is backed by an index and ends with the unique field
+    orderings = {
+        'id': ('id',),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+
+    @conditionalResponse('products')
+    @cacheResponse('products')
     def get(self, request: Request) -> Response:
         offset = request.GET.get('offset')
         if offset:
-            try:
-                offset = json.loads(offset)
-                offset = ProductListOffsetScheme(**offset)
-            except (TypeError, json.decoder.JSONDecodeError):
-                response_data = {
-                    'errors': [makeResponseData(status=400, message='Offset must be a valid JSON string')]
-                }
-                return Response(response, status=status.HTTP_400_BAD_REQUEST)
-            except ValidationError as e:
-                response_data = {
-                    'errors': [makeResponseData(status=400, message='Offset validation error', details=e.errors())]
-                }
-                return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            offset = ProductListOffsetScheme(start=0, end=5)
+            return self.getOffsetPage(request, offset)
+
+        try:
+            page = ProductListPageScheme(**request.GET.dict())
+            cursor = decodeCursor(page.cursor) if page.cursor else None
+        except ValidationError as e:
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Page validation error', details=e.errors())]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Cursor must be a valid cursor string')]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        products = ProductSerializer.setupQuerySet(self.filterProducts(page))
+        try:
+            products, next_cursor, prev_cursor = paginateByCursor(
+                products, self.orderings[page.ordering], cursor, page.limit
+            )
+        except (ValueError, DjangoValidationError):
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Cursor does not match the product list')]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        serialized_products = ProductSerializer(products, many=True).data
+
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={'products': serialized_products, 'next': next_cursor, 'prev': prev_cursor}
+        )
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    def filterProducts(self, page: ProductListPageScheme) -> QuerySet:
+        filter_kwargs = {}
+
+        if page.category is not None:
+            filter_kwargs['category_id'] = page.category
+        if page.price_min is not None:
+            filter_kwargs['price__gte'] = page.price_min
+        if page.price_max is not None:
+            filter_kwargs['price__lte'] = page.price_max
+        if page.available is True:
+            filter_kwargs['available_quantity__gt'] = 0
+        elif page.available is False:
+            filter_kwargs['available_quantity__lte'] = 0
+
+        return Product.objects.filter(**filter_kwargs)
+
+    def getOffsetPage(self, request: Request, offset: str) -> Response:
+        try:
+            offset = json.loads(offset)
+            offset = ProductListOffsetScheme(**offset)
+        except (TypeError, json.decoder.JSONDecodeError):
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Offset must be a valid JSON string')]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Offset validation error', details=e.errors())]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
         
-        products = Product.objects.all()[offset.start:offset.end]
+        products = ProductSerializer.setupQuerySet(Product.objects.order_by(*self.orderings['id']))
+        products = products[offset.start:offset.end]
         serialized_products = ProductSerializer(products, many=True).data
 
         response_data = makeResponseData(
@@ -124,10 +223,11 @@ class ProductList(APIView):
 
             images = request.FILES.getlist('images')
             for image in images:
-                ProductImage.objects.create(
+                product_image = ProductImage.objects.create(
                     product=product,
                     image=image
                 )
+                scheduleProductImageVariants(product_image)
 
             response_data = makeResponseData(
                 status=201,
@@ -137,13 +237,101 @@ class ProductList(APIView):
             return Response(response_data, status=status.HTTP_201_CREATED)
 
 
-class ProductDetail(APIView):
+class ProductSearch(AtomicWritesMixin, APIView):
+    # Number of the first typed words which are used in the search
+    max_terms = 10
+
+    @conditionalResponse('products')
+    @cacheResponse('products')
+    def get(self, request: Request) -> Response:
+        try:
+            search = ProductSearchScheme(**request.GET.dict())
+        except ValidationError as e:
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Search validation error', details=e.errors())]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        terms = re.findall(r'\w+', search.q.lower())[:self.max_terms]
+        if not terms:
+            response_data = makeResponseData(status=200, message='OK', details={'products': []})
+            return Response(response_data, status=status.HTTP_200_OK)
+
+        # Whole words are matched in any form, the typed words are matched as prefixes
+        search_query = (
+            SearchQuery(' '.join(terms), config='russian')
+            | SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='simple')
+        )
+
+        products = ProductSerializer.setupQuerySet(
+            Product.objects.filter(search_vector=search_query)
+        )
+        products = products.annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', 'id')[:search.limit]
+        serialized_products = ProductSerializer(products, many=True).data
+
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={'products': serialized_products}
+        )
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+# Every chunk is committed on its own, see `importProducts`, so product locks aren't held
+# until the whole file is imported
+class ProductImport(NonAtomicRequestsMixin, APIView):
+    content_types = {
+        'text/csv': 'csv',
+        'application/jsonl': 'jsonl',
+        'application/x-ndjson': 'jsonl',
+    }
+
+    @checkAuthToken
+    def post(self, request: Request) -> Response:
+        """Imports products from CSV or JSON Lines.
+        The file is sent as the request body or as the `file` field of a multipart form.
+        """
+
+        if request.content_type.startswith('multipart/form-data'):
+            stream = request.FILES.get('file')
+            file_format = stream.name.rsplit('.', 1)[-1].lower() if stream else None
+        else:
+            stream = request.stream
+            file_format = self.content_types.get(request.content_type.split(';')[0].strip())
+
+        if stream is None:
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Import file is empty')]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        if file_format not in PRODUCT_IMPORT_FORMATS:
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Import file must be CSV or JSON Lines')]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        report = importProducts(readProductRows(stream, file_format))
+
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={'import': report}
+        )
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class ProductDetail(AtomicWritesMixin, APIView):
     def getObject(self, product_slug: str) -> Product:
         try:
             return Product.objects.get(slug=product_slug)
         except Product.DoesNotExist:
             raise Http404
 
+    @conditionalResponse('products', object_kwarg='product_slug')
+    @cacheResponse('products', object_kwarg='product_slug')
     def get(self, request: Request, product_slug: str) -> Response:
         product = self.getObject(product_slug)
         serialized_product = ProductSerializer(product).data
@@ -175,28 +363,109 @@ class ProductDetail(APIView):
         return Response(response_data, status=status.HTTP_204_NO_CONTENT)
 
 
-class OrderList(APIView):
+class OrderList(AtomicWritesMixin, APIView):
+    ordering = ('-created_at', '-id')
+
+    @conditionalResponse('orders')
     def get(self, request: Request) -> Response:
-        orders = Order.objects.all()
+        try:
+            page = OrderListPageScheme(**request.GET.dict())
+            cursor = decodeCursor(page.cursor) if page.cursor else None
+        except ValidationError as e:
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Page validation error', details=e.errors())]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Cursor must be a valid cursor string')]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        orders = self.filterOrders(page)
+
+        if page.page is not None:
+            orders_page = list(self.getNumberedPage(orders, page))
+            next_cursor = prev_cursor = None
+        else:
+            try:
+                orders_page, next_cursor, prev_cursor = paginateByCursor(orders, self.ordering, cursor, page.limit)
+            except (ValueError, DjangoValidationError):
+                response_data = {
+                    'errors': [makeResponseData(status=400, message='Cursor does not match the order list')]
+                }
+                return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
 
-        filters = ('contact', 'contact_type')
-        query_params = request.query_params
-        filter_kwargs = makeModelFilterKwargs(filters, query_params)
-        if filter_kwargs:
-            orders = orders.filter(**filter_kwargs)
+        orders_count = orders.count() if page.count else None
+
+        status_counts = None
+        if page.status_counts:
+            status_counts = {row['status']: row['count'] for row in self.countStatuses(orders)}
 
-        serialized_orders = OrderSerializer(orders, many=True).data
+        serialized_orders = OrderSerializer(orders_page, many=True).data
         response_data = makeResponseData(
             status=200,
             message='OK',
-            details={'orders': serialized_orders}
+            details={
+                'orders': serialized_orders,
+                'count': orders_count,
+                'status_counts': status_counts,
+                'next': next_cursor,
+                'prev': prev_cursor,
+            }
         )
         return Response(response_data, status=status.HTTP_200_OK)
 
+    def getNumberedPage(self, orders: QuerySet, page: OrderListPageScheme) -> QuerySet:
+        start_index = (page.page - 1) * page.limit
+        return orders.order_by(*self.ordering)[start_index:start_index + page.limit]
+
+    def countStatuses(self, orders: QuerySet) -> QuerySet:
+        "Counts the filtered orders by status with one grouped query."
+        return orders.prefetch_related(None).order_by().values('status').annotate(count=Count('id'))
+
+    def filterOrders(self, filters: OrderListFilterScheme) -> QuerySet:
+        orders = OrderSerializer.setupQuerySet(Order.objects.all())
+
+        filter_kwargs = {}
+        for field in ('contact', 'contact_type', 'status'):
+            value = getattr(filters, field)
+            if value is not None:
+                filter_kwargs[field] = value
+
+        for field in ('created_at', 'updated_at'):
+            date_range = getattr(filters, field)
+            if date_range is not None:
+                date_from, date_to = date_range
+                filter_kwargs[f'{field}__range'] = [
+                    timezone.make_aware(datetime.combine(date_from, time.min)),
+                    timezone.make_aware(datetime.combine(date_to, time.max)),
+                ]
+
+        if filter_kwargs:
+            orders = orders.filter(**filter_kwargs)
+        return orders
+
     def post(self, request: Request) -> Response:
         serializer = OrderSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
-            serializer.save()
+            products = serializer.validated_data['products']
+            # Products don't repeat in the order, see `OrderSerializer.validate_products`
+            quantities = {product.id: 1 for product in products}
+
+            try:
+                with transaction.atomic():
+                    Product.reserveStock(quantities)
+                    serializer.save()
+            except OutOfStockError:
+                response_data = {
+                    'errors': [makeResponseData(status=409, message='Not enough products in stock')]
+                }
+                return Response(response_data, status=status.HTTP_409_CONFLICT)
+
+            # The stock update query doesn't send model signals, only the ordered products have changed
+            invalidateObjectsOnChange('products', [product.slug for product in products])
+
             response_data = makeResponseData(
                 status=201,
                 message='Created',
@@ -205,7 +474,45 @@ class OrderList(APIView):
             return Response(response_data, status=status.HTTP_201_CREATED)
 
 
-class OrderDetail(APIView):
+class OrderStatusBulk(AtomicWritesMixin, APIView):
+    @checkAuthToken
+    def post(self, request: Request) -> Response:
+        try:
+            data = OrderStatusBulkScheme(**request.data)
+        except (TypeError, ValidationError) as e:
+            details = e.errors() if isinstance(e, ValidationError) else None
+            response_data = {
+                'errors': [makeResponseData(status=400, message='Orders status validation error', details=details)]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        if data.status not in Order.status_transitions:
+            response_data = {
+                'errors': [makeResponseData(status=400, message=f'Unknown order status: {data.status}')]
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        changed_orders_ids = Order.changeStatuses(set(data.ids), data.status)
+        if changed_orders_ids:
+            # The update queries don't send model signals
+            invalidateOnChange('orders')
+            if data.status in Order.releasing_statuses:
+                invalidateObjectsOnChange('products', Order.releaseProducts(changed_orders_ids))
+        skipped_orders_ids = set(data.ids) - set(changed_orders_ids)
+
+        response_data = makeResponseData(
+            status=200,
+            message='OK',
+            details={
+                'status': data.status,
+                'changed': [str(order_id) for order_id in changed_orders_ids],
+                'skipped': [str(order_id) for order_id in skipped_orders_ids],
+            }
+        )
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class OrderDetail(AtomicWritesMixin, APIView):
     def getObject(self, order_id: str) -> Order:
         try:
             order_id = uuid.UUID(order_id).hex
@@ -213,6 +520,7 @@ class OrderDetail(APIView):
         except Order.DoesNotExist:
             raise Http404
 
+    @conditionalResponse('orders')
     def get(self, request: Request, order_id: str) -> Response:
         order = self.getObject(order_id)
         serialized_order = OrderSerializer(order).data
@@ -228,7 +536,28 @@ class OrderDetail(APIView):
         order = self.getObject(order_id)
         serializer = OrderSerializer(order, data=request.data, partial=True)
         if serializer.is_valid(raise_exception=True):
-            serializer.save()
+            new_status = serializer.validated_data.get('status', order.status)
+            if new_status != order.status and new_status not in Order.status_transitions.get(order.status, ()):
+                message = f'Order cannot be moved from {order.status} to {new_status}'
+                response_data = {'errors': [makeResponseData(status=400, message=message)]}
+                return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                with transaction.atomic():
+                    changed_products_slugs = order.updateReservedProducts(
+                        serializer.validated_data.get('products'), new_status
+                    )
+                    serializer.save()
+            except OutOfStockError:
+                response_data = {
+                    'errors': [makeResponseData(status=409, message='Not enough products in stock')]
+                }
+                return Response(response_data, status=status.HTTP_409_CONFLICT)
+
+            if changed_products_slugs:
+                # The stock update queries don't send model signals
+                invalidateObjectsOnChange('products', changed_products_slugs)
+
             response_data = makeResponseData(
                 status=200,
                 message='OK',
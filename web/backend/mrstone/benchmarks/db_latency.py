@@ -0,0 +1,101 @@
+"""Measures the latency of `CategoryList.get` with and without persistent connections and the request transaction.
+
+Requests go through the WSGI handler, so connections are closed or kept at the request end as in production.
+Needs the database and Redis from the project settings, run from the `mrstone` directory:
+
+    python -m benchmarks.db_latency --requests 2000
+"""
+
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mrstone.settings')
+
+import django
+django.setup()
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.urls import resolve, reverse
+from django.core.handlers.wsgi import WSGIHandler
+
+import io
+import time
+import argparse
+import statistics
+import itertools
+
+
+def makeEnviron(path: str, query_string: str, client_address: str) -> dict:
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': '127.0.0.1',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': client_address,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def measure(handler: WSGIHandler, path: str, requests_count: int, request_numbers) -> dict:
+    def startResponse(status, headers):
+        if not status.startswith('200'):
+            raise RuntimeError(f'{path} responded with {status}')
+
+    timings = []
+    for i in range(requests_count):
+        request_number = next(request_numbers)
+        # A unique query misses the response cache, every client address stays under the rate limit
+        client_address = f'10.{request_number >> 16 & 255}.{request_number >> 8 & 255}.{request_number & 255}'
+        environ = makeEnviron(path, f'request={request_number}', client_address)
+
+        started_at = time.perf_counter()
+        response = handler(environ, startResponse)
+        b''.join(response)
+        # The connection is closed or kept on `request_finished`, which is sent when the response is closed
+        response.close()
+        timings.append(time.perf_counter() - started_at)
+
+    timings.sort()
+    return {
+        'mean ms': round(statistics.mean(timings) * 1000, 3),
+        'p50 ms': round(timings[len(timings) // 2] * 1000, 3),
+        'p99 ms': round(timings[int(len(timings) * 0.99)] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--conn-max-age', type=int, default=60, help='CONN_MAX_AGE of the persistent connections')
+    options = parser.parse_args()
+
+    handler = WSGIHandler()
+    path = reverse('category_list')
+    # `AtomicWritesMixin` puts the database into this set, the request transaction is restored by removing it
+    non_atomic_requests = resolve(path).func._non_atomic_requests
+    database_settings = connections[DEFAULT_DB_ALIAS].settings_dict
+    request_numbers = itertools.count(1)
+
+    for conn_max_age, in_transaction in itertools.product((0, options.conn_max_age), (True, False)):
+        database_settings['CONN_MAX_AGE'] = conn_max_age
+        connections[DEFAULT_DB_ALIAS].close()
+        if in_transaction:
+            non_atomic_requests.discard(DEFAULT_DB_ALIAS)
+        else:
+            non_atomic_requests.add(DEFAULT_DB_ALIAS)
+
+        measure(handler, path, min(100, options.requests), request_numbers)
+        results = measure(handler, path, options.requests, request_numbers)
+
+        variant = f'CONN_MAX_AGE={conn_max_age:<4} transaction={"on " if in_transaction else "off"}'
+        print(variant, '  '.join(f'{key}: {value}' for key, value in results.items()), flush=True)
+
+
+if __name__ == '__main__':
+    main()
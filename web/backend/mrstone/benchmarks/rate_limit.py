@@ -0,0 +1,114 @@
+"""Compares `RateLimitMiddleware` with the previous implementation, which made get, ttl and set calls.
+
+Needs the Redis server from the project settings, run from the `mrstone` directory:
+
+    python -m benchmarks.rate_limit --requests 5000 --threads 16
+"""
+
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mrstone.settings')
+
+import django
+django.setup()
+
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from cache import Cache
+from utils import getCurrentDateTime
+from mrstone.middleware import RateLimitMiddleware
+
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Nothing is rejected, so both implementations do the same work for every request
+DELAY_LEVELS = ({'limit': 10 ** 9, 'delay': 0},)
+
+
+class LegacyRateLimit:
+    "The state check of the previous implementation: JSON value, three Redis calls per request."
+
+    def process_request(self, request) -> None:
+        now = getCurrentDateTime(exclude_timezone=True)
+        cache = Cache()
+        client_cache_key = f'requests:{request.META["REMOTE_ADDR"]}'
+        client_requests = cache.getValue(client_cache_key)
+        client_cache_key_ttl = cache.getKeyTTL(client_cache_key)
+
+        if client_requests:
+            client_requests = json.loads(client_requests)
+            client_requests_count = client_requests['count'] + 1
+            datetime.strptime(client_requests['last_request'], '%Y-%m-%d %H:%M:%S.%f')
+        else:
+            client_requests_count = 1
+            client_cache_key_ttl = 60
+
+        client_requests = json.dumps({'count': client_requests_count, 'last_request': now}, default=str)
+        cache.setValue(key=client_cache_key, value=client_requests, expire=client_cache_key_ttl)
+
+    def getCount(self, client_ip: str) -> int:
+        return json.loads(Cache().getValue(f'requests:{client_ip}'))['count']
+
+
+class ScriptRateLimit:
+    "The current implementation: one atomic Lua script call per request."
+
+    def __init__(self):
+        with override_settings(RATE_LIMIT_DELAY_LEVELS=DELAY_LEVELS):
+            self.middleware = RateLimitMiddleware(lambda request: HttpResponse())
+
+    def process_request(self, request) -> None:
+        self.middleware.process_request(request)
+
+    def getCount(self, client_ip: str) -> int:
+        return int(Cache().redis_client.hget(f'rate_limit:{client_ip}', 'count'))
+
+
+def measure(implementation, requests_count: int, threads: int) -> dict:
+    client_ip = '203.0.113.10'
+    cache = Cache()
+    cache.deleteKey(f'requests:{client_ip}')
+    cache.deleteKey(f'rate_limit:{client_ip}')
+    request = RequestFactory().get('/', REMOTE_ADDR=client_ip)
+
+    def timeRequest(i: int) -> float:
+        started_at = time.perf_counter()
+        implementation.process_request(request)
+        return time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        timings = list(executor.map(timeRequest, range(requests_count)))
+    total_time = time.perf_counter() - started_at
+
+    timings.sort()
+    return {
+        'requests/s': round(requests_count / total_time),
+        'mean ms': round(statistics.mean(timings) * 1000, 3),
+        'p50 ms': round(timings[len(timings) // 2] * 1000, 3),
+        'p99 ms': round(timings[int(len(timings) * 0.99)] * 1000, 3),
+        # Concurrent read-modify-write of the legacy value loses counts
+        'lost counts': requests_count - implementation.getCount(client_ip),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=16)
+    options = parser.parse_args()
+
+    for name, implementation in (('get/ttl/set', LegacyRateLimit()), ('lua script', ScriptRateLimit())):
+        # Warm up the connection pool
+        measure(implementation, 100, options.threads)
+        results = measure(implementation, options.requests, options.threads)
+        print(f'{name:<12}', '  '.join(f'{key}: {value}' for key, value in results.items()))
+
+
+if __name__ == '__main__':
+    main()
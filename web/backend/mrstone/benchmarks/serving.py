@@ -0,0 +1,133 @@
+"""Compares requests/s of one worker serving the store under ASGI (uvicorn) and WSGI (gunicorn).
+
+Needs the database and Redis from the project settings and the servers, run from the `mrstone` directory:
+
+    pip install uvicorn gunicorn
+    python -m benchmarks.serving --path '/store/products/?limit=20' --duration 20 --concurrency 64
+"""
+
+import argparse
+import http.client
+import signal
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Both servers run one worker, the WSGI worker serves requests with a pool of threads
+SERVER_COMMANDS = {
+    'asgi': ['uvicorn', 'mrstone.asgi:application', '--workers', '1', '--no-access-log', '--port', '{port}'],
+    'wsgi': [
+        'gunicorn', 'mrstone.wsgi:application', '--workers', '1',
+        '--worker-class', 'gthread', '--threads', '{threads}', '--bind', '127.0.0.1:{port}',
+    ],
+}
+
+
+def startServer(interface: str, port: int, threads: int) -> subprocess.Popen:
+    command = [part.format(port=port, threads=threads) for part in SERVER_COMMANDS[interface]]
+    server = subprocess.Popen(command, cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    started_at = time.monotonic()
+    while time.monotonic() - started_at < 30:
+        if server.poll() is not None:
+            raise RuntimeError(f'{interface} server exited: {server.stderr.read().decode()}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+
+    stopServer(server)
+    raise RuntimeError(f'{interface} server did not start in 30 seconds')
+
+
+def stopServer(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def generateLoad(port: int, path: str, duration: float, concurrency: int) -> dict:
+    """Sends requests over `concurrency` keep-alive connections for `duration` seconds.
+    Every request comes from its own client address, so the rate limit doesn't reject the load.
+    """
+
+    deadline = time.monotonic() + duration
+    addresses = iter(range(1, 2 ** 24))
+    addresses_lock = threading.Lock()
+
+    def runClient(i: int) -> tuple[list[float], int]:
+        timings, errors = [], 0
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.monotonic() < deadline:
+            with addresses_lock:
+                address = next(addresses)
+            headers = {'X-Forwarded-For': f'10.{address >> 16 & 255}.{address >> 8 & 255}.{address & 255}'}
+
+            started_at = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                continue
+
+            if response.status == 200:
+                timings.append(time.perf_counter() - started_at)
+            else:
+                errors += 1
+        connection.close()
+        return timings, errors
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(runClient, range(concurrency)))
+    total_time = time.monotonic() - started_at
+
+    timings = sorted(timing for client_timings, errors in results for timing in client_timings)
+    if not timings:
+        raise RuntimeError(f'No successful responses from {path}')
+
+    return {
+        'requests/s': round(len(timings) / total_time),
+        'mean ms': round(statistics.mean(timings) * 1000, 2),
+        'p50 ms': round(timings[len(timings) // 2] * 1000, 2),
+        'p99 ms': round(timings[int(len(timings) * 0.99)] * 1000, 2),
+        'errors': sum(errors for client_timings, errors in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default='/store/products/?limit=20')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--wsgi-threads', type=int, default=8)
+    parser.add_argument('--interfaces', nargs='+', choices=SERVER_COMMANDS.keys(), default=list(SERVER_COMMANDS))
+    options = parser.parse_args()
+
+    for interface in options.interfaces:
+        server = startServer(interface, options.port, options.wsgi_threads)
+        try:
+            # Warm up connections, caches and lazy imports of the worker
+            generateLoad(options.port, options.path, min(3, options.duration), options.concurrency)
+            results = generateLoad(options.port, options.path, options.duration, options.concurrency)
+        finally:
+            stopServer(server)
+        print(f'{interface}  ', '  '.join(f'{key}: {value}' for key, value in results.items()), flush=True)
+
+
+if __name__ == '__main__':
+    main()
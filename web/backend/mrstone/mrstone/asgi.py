@@ -1,8 +1,23 @@
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mrstone.settings')
+# Persistent database connections are off by default under ASGI, see `DATABASES` in the settings
+os.environ['MRSTONE_SERVER_INTERFACE'] = 'asgi'
 
-application = get_asgi_application()
+
+class AsyncURLConfASGIHandler(ASGIHandler):
+    "Routes requests to `ASYNC_URLCONF`, where read views are async and don't occupy a thread each."
+
+    async def get_response_async(self, request):
+        request.urlconf = settings.ASYNC_URLCONF
+        return await super().get_response_async(request)
+
+
+django.setup(set_prefix=False)
+
+application = AsyncURLConfASGIHandler()
@@ -1,22 +1,31 @@
 from django.conf import settings
 from django.http import JsonResponse
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 
 import logs
-from utils import makeResponseData, getClientIP, getCurrentDateTime
-from cache import Cache
+from alerts import makeExceptionFingerprint
+from utils import makeResponseData, getClientIP
+from cache import Cache, AsyncCache
+from mrstone.routers import REPLICA_DATABASE, request_routing_state, makeRoutingState
 
-import json
+import time
 import traceback
-from datetime import datetime
 
 
 class ExceptionMiddleware:
     """Intercepts all project exceptions and logs them in the log file."""
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, next):
         self.next = next
+        self.async_mode = iscoroutinefunction(self.next)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        # In the async mode the coroutine of the next handler is returned and awaited by the caller
         response = self.next(request)
         return response
 
@@ -24,7 +33,8 @@ class ExceptionMiddleware:
         logs.addLog(
             level='error', 
             message=traceback.format_exc(),
-            send_telegram_message=True
+            send_telegram_message=True,
+            fingerprint=makeExceptionFingerprint(exception),
         )
 
         if settings.DEBUG:
@@ -38,67 +48,150 @@ class ExceptionMiddleware:
 
 
 class RateLimitMiddleware:
-    """Limits the number of requests per minute from one ip address."""
+    """Limits the number of requests per minute from one ip address.
+    Under ASGI the state is checked with the async Redis client, so the event loop isn't blocked.
+    """
+
+    # Lua script which checks and updates the client requests state in one atomic call.
+    # KEYS[1] - client key, ARGV[1] - current time (ms), ARGV[2] - window (s),
+    # ARGV[3..] - pairs of requests count limit and minimal delay (ms) between requests.
+    script = """
+        local state = redis.call('HMGET', KEYS[1], 'count', 'last')
+        local count = tonumber(state[1])
+        local now = tonumber(ARGV[1])
+        local reject = 0
+
+        if count then
+            -- Parallel requests can reach Redis out of order, an earlier time counts as no delay
+            local last = tonumber(state[2])
+            local delay = math.max(now - last, 0)
+            reject = 1
+            for i = 3, #ARGV, 2 do
+                if count < tonumber(ARGV[i]) then
+                    if delay >= tonumber(ARGV[i + 1]) then
+                        reject = 0
+                    end
+                    break
+                end
+            end
+            redis.call('HSET', KEYS[1], 'count', count + 1, 'last', math.max(now, last))
+        else
+            redis.call('HSET', KEYS[1], 'count', 1, 'last', now)
+            redis.call('EXPIRE', KEYS[1], ARGV[2])
+        end
+
+        return reject
+    """
+
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, next):
         self.next = next
+        # The window and the delay levels are taken from `RATE_LIMIT_WINDOW_SECONDS` and `RATE_LIMIT_DELAY_LEVELS`
+        self.script_args = [settings.RATE_LIMIT_WINDOW_SECONDS]
+        for level in settings.RATE_LIMIT_DELAY_LEVELS:
+            self.script_args.extend((level['limit'], level['delay']))
+
+        self.async_mode = iscoroutinefunction(self.next)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        else:
+            self.rate_limit_script = Cache().registerScript(self.script)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.acall(request)
+
         response = self.process_request(request)
         if not response:
             response = self.next(request)
         return response
 
+    async def acall(self, request):
+        response = await self.aprocess_request(request)
+        if not response:
+            response = await self.next(request)
+        return response
+
     def process_request(self, request) -> None | JsonResponse:
-        now = getCurrentDateTime(exclude_timezone=True)
+        client_cache_key, script_args = self.makeScriptCall(request)
+        reject_request = self.rate_limit_script(keys=[client_cache_key], args=script_args)
+        if reject_request:
+            return self.makeRejectResponse()
+
+    async def aprocess_request(self, request) -> None | JsonResponse:
+        client_cache_key, script_args = self.makeScriptCall(request)
+        # The async client is bound to the running event loop, so the script is registered on every call,
+        # it costs only the script hash calculation
+        rate_limit_script = AsyncCache().registerScript(self.script)
+        reject_request = await rate_limit_script(keys=[client_cache_key], args=script_args)
+        if reject_request:
+            return self.makeRejectResponse()
+
+    def makeScriptCall(self, request) -> tuple[str, list]:
+        now = int(time.time() * 1000)
         client_ip: str = getClientIP(request)
-        reject_request = False
-
-        cache = Cache()
-        client_cache_key = f'requests:{client_ip}'
-        client_requests = cache.getValue(client_cache_key)
-        client_cache_key_ttl = cache.getKeyTTL(client_cache_key)
-
-        if client_requests:
-            client_requests = json.loads(client_requests)
-            client_requests_count = client_requests['count']
-            client_last_request = datetime.strptime(
-                client_requests['last_request'],
-                '%Y-%m-%d %H:%M:%S.%f'
-            )
+        return f'rate_limit:{client_ip}', [now, *self.script_args]
 
-            # Selecting the delay time depending on the number of requests
-            delay_levels = {
-                1: {'range': range(0, 50), 'delay': 0},
-                2: {'range': range(50, 100), 'delay': 0.25},
-                3: {'range': range(100, 200), 'delay': 0.5},
-            }
-            for level in delay_levels.values():
-                if client_requests_count in level['range']:
-                    request_delay = (now - client_last_request).seconds
-                    if request_delay < level['delay']:
-                        reject_request = True
-                    break
-            else:
-                reject_request = True
+    def makeRejectResponse(self) -> JsonResponse:
+        response_data = makeResponseData(status=429, message='Too Many Requests')
+        return JsonResponse(response_data, status=429)
 
-            client_requests_count += 1
-        else:
-            client_requests_count = 1
-            client_cache_key_ttl = 60
-
-        # Set actual client requests state
-        client_requests = json.dumps({
-            'count': client_requests_count, 
-            'last_request': now
-        }, default=str)
-
-        cache.setValue(
-            key=client_cache_key, 
-            value=client_requests, 
-            expire=client_cache_key_ttl
+
+class DatabaseRoutingMiddleware:
+    """Lets `ReplicaRouter` send reads of GET requests to the replica.
+    After a write the client gets a cookie which keeps its requests on the primary
+    until the replica catches up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    primary_pin_cookie = 'db_primary_pin'
+    read_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, next):
+        self.next = next
+        self.replica_enabled = REPLICA_DATABASE in settings.DATABASES
+
+        self.async_mode = iscoroutinefunction(self.next)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.acall(request)
+
+        state = self.makeState(request)
+        token = request_routing_state.set(state)
+        try:
+            response = self.next(request)
+        finally:
+            request_routing_state.reset(token)
+        return self.processResponse(request, response, state)
+
+    async def acall(self, request):
+        state = self.makeState(request)
+        token = request_routing_state.set(state)
+        try:
+            response = await self.next(request)
+        finally:
+            request_routing_state.reset(token)
+        return self.processResponse(request, response, state)
+
+    def makeState(self, request) -> dict:
+        use_replica = (
+            self.replica_enabled
+            and request.method in self.read_methods
+            and self.primary_pin_cookie not in request.COOKIES
         )
+        return makeRoutingState(use_replica)
 
-        if reject_request:
-            response_data = makeResponseData(status=429, message='Too Many Requests')
-            return JsonResponse(response_data, status=429)
+    def processResponse(self, request, response, state: dict):
+        if self.replica_enabled and (state['written'] or request.method not in self.read_methods):
+            response.set_cookie(
+                self.primary_pin_cookie, '1',
+                max_age=settings.DB_REPLICA_PRIMARY_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,54 @@
+from django.db import connections
+
+from contextvars import ContextVar
+
+
+REPLICA_DATABASE = 'replica'
+PRIMARY_DATABASE = 'default'
+
+# Routing state of the current request, set by `DatabaseRoutingMiddleware`.
+# The state is a mutable dict, so a write noticed in a thread of `sync_to_async`
+# is seen by the rest of the request.
+request_routing_state: ContextVar[dict | None] = ContextVar('request_routing_state', default=None)
+
+
+def makeRoutingState(use_replica: bool) -> dict:
+    return {'use_replica': use_replica, 'written': False}
+
+
+def usePrimaryDatabase() -> None:
+    "Sends the remaining reads of the current request to the primary database."
+
+    state = request_routing_state.get()
+    if state:
+        state['use_replica'] = False
+
+
+class ReplicaRouter:
+    """
+    Sends reads of GET requests to the replica, everything else goes to the primary database.
+    After the first write of the request, or inside a transaction, reads stay on the primary,
+    so the request sees its own changes.
+    """
+
+    def db_for_read(self, model, **hints) -> str | None:
+        state = request_routing_state.get()
+        if not state or not state['use_replica'] or state['written']:
+            return PRIMARY_DATABASE
+
+        if connections[PRIMARY_DATABASE].in_atomic_block:
+            return PRIMARY_DATABASE
+        return REPLICA_DATABASE
+
+    def db_for_write(self, model, **hints) -> str:
+        state = request_routing_state.get()
+        if state:
+            state['written'] = True
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # Both databases have the same data
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, model_name: str = None, **hints) -> bool:
+        return db == PRIMARY_DATABASE
@@ -8,6 +8,9 @@ from config import project_settings
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Set by `mrstone.asgi` before the settings are loaded
+ASGI_SERVER = os.environ.get('MRSTONE_SERVER_INTERFACE') == 'asgi'
+
 SECRET_KEY = project_settings.DJANGO_SECRET_KEY
 
 DEBUG = True
@@ -23,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # External apps
     'rest_framework',
@@ -39,10 +43,25 @@ MIDDLEWARE = [
     # Internal middleware
     'mrstone.middleware.ExceptionMiddleware',
     'mrstone.middleware.RateLimitMiddleware',
+    'mrstone.middleware.DatabaseRoutingMiddleware',
 ]
 
+# Window of the requests count of one ip address, see `mrstone.middleware.RateLimitMiddleware`
+RATE_LIMIT_WINDOW_SECONDS = 60
+
+# Selecting the delay time (ms) depending on the number of requests,
+# requests above the last level are rejected
+RATE_LIMIT_DELAY_LEVELS = (
+    {'limit': 50, 'delay': 0},
+    {'limit': 100, 'delay': 250},
+    {'limit': 200, 'delay': 500},
+)
+
 ROOT_URLCONF = 'mrstone.urls'
 
+# URLs of the ASGI application, see `mrstone.asgi`
+ASYNC_URLCONF = 'mrstone.async_urls'
+
 REST_FRAMEWORK = { 
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'DEFAULT_PERMISSION_CLASSES': [],
@@ -80,10 +99,42 @@ DATABASES = {
         'NAME': project_settings.DB_NAME,
         'USER': project_settings.DB_USER,
         'PASSWORD': project_settings.DB_PASSWORD,
+        # Store views run only writes in a transaction, see `apps.store.views.AtomicWritesMixin`
         'ATOMIC_REQUESTS': True,
+        # Persistent connections skip the connection setup on every request,
+        # a reused connection is checked before the first query of the request.
+        # Under ASGI every request gets its own connection, which is never reused, so persistent
+        # connections only pile up until the database limit. They are off there unless set explicitly,
+        # a connection pooler (pgbouncer) should be used instead
+        'CONN_MAX_AGE': (
+            project_settings.DB_CONN_MAX_AGE if project_settings.DB_CONN_MAX_AGE is not None
+            else 0 if ASGI_SERVER else 60
+        ),
+        'CONN_HEALTH_CHECKS': project_settings.DB_CONN_HEALTH_CHECKS,
     },
 }
 
+DATABASE_ROUTERS = []
+
+if project_settings.DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': project_settings.DB_REPLICA_HOST,
+        'PORT': project_settings.DB_REPLICA_PORT or project_settings.DB_PORT,
+        'NAME': project_settings.DB_REPLICA_NAME or project_settings.DB_NAME,
+        'USER': project_settings.DB_REPLICA_USER or project_settings.DB_USER,
+        'PASSWORD': project_settings.DB_REPLICA_PASSWORD or project_settings.DB_PASSWORD,
+        # Requests are made atomic on every database with this option, and only the default database
+        # is opted out by the views. Async views can't be atomic at all, and reads of the replica don't need it
+        'ATOMIC_REQUESTS': False,
+        # Tests read the replica from the primary test database
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS.append('mrstone.routers.ReplicaRouter')
+
+# Seconds the client reads from the primary after its write
+DB_REPLICA_PRIMARY_PIN_SECONDS = project_settings.DB_REPLICA_PRIMARY_PIN_SECONDS
+
 # Internationalization
 LANGUAGE_CODE = 'ru-RU'
 TIME_ZONE = 'UTC'
@@ -102,5 +153,8 @@ else:
 MEDIA_URL = 'media/'
 MEDIA_ROOT = 'media'
 
+# Number of processes which make product image variants
+PRODUCT_IMAGE_WORKERS = project_settings.PRODUCT_IMAGE_WORKERS
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
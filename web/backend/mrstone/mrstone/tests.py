@@ -0,0 +1,347 @@
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from django.http import HttpResponse
+from django.urls import resolve, reverse
+from django.db.utils import ConnectionHandler
+from django.core.handlers.base import BaseHandler
+from rest_framework.response import Response
+
+from mrstone.routers import ReplicaRouter, request_routing_state, makeRoutingState
+from mrstone.middleware import DatabaseRoutingMiddleware, RateLimitMiddleware
+from apps.store.caching import (
+    cacheResponse, conditionalResponse, invalidateNamespace, getNamespaceModifiedKey,
+)
+
+from cache import Cache
+from alerts import AlertAggregator, MESSAGE_MAX_LENGTH, makeExceptionFingerprint
+from logs import LogWriter, makeLogRecord
+from config import project_settings
+
+import os
+import json
+import time
+import runpy
+import asyncio
+import tempfile
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def testReadsAfterWriteStayOnPrimary(self):
+        router = ReplicaRouter()
+
+        # Outside of a request everything goes to the primary
+        self.assertEqual(router.db_for_read(None), 'default')
+
+        token = request_routing_state.set(makeRoutingState(use_replica=True))
+        try:
+            self.assertEqual(router.db_for_read(None), 'replica')
+            self.assertEqual(router.db_for_write(None), 'default')
+            self.assertEqual(router.db_for_read(None), 'default')
+        finally:
+            request_routing_state.reset(token)
+
+
+    @override_settings(DATABASES={'default': {}, 'replica': {}})
+    def testWritePinsClientToPrimary(self):
+        routing_states = []
+
+        def view(request):
+            routing_states.append(request_routing_state.get())
+            return HttpResponse()
+
+        middleware = DatabaseRoutingMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.get('/'))
+        self.assertTrue(routing_states[-1]['use_replica'])
+        self.assertNotIn(middleware.primary_pin_cookie, response.cookies)
+
+        response = middleware(factory.post('/'))
+        self.assertFalse(routing_states[-1]['use_replica'])
+        self.assertIn(middleware.primary_pin_cookie, response.cookies)
+
+        request = factory.get('/')
+        request.COOKIES[middleware.primary_pin_cookie] = '1'
+        middleware(request)
+        self.assertFalse(routing_states[-1]['use_replica'])
+
+
+    @override_settings(DB_REPLICA_PRIMARY_PIN_SECONDS=5)
+    def testReadsOfChangedNamespaceStayOnPrimary(self):
+        routing_states = []
+
+        class View:
+            @conditionalResponse('categories')
+            @cacheResponse('categories')
+            def get(self, request):
+                routing_states.append(dict(request_routing_state.get()))
+                return Response({'categories': []})
+
+        def requestView():
+            token = request_routing_state.set(makeRoutingState(use_replica=True))
+            try:
+                View().get(RequestFactory().get('/categories/'))
+            finally:
+                request_routing_state.reset(token)
+
+        # The replica can still return the old data, which would be cached with the new version
+        invalidateNamespace('categories')
+        requestView()
+        self.assertFalse(routing_states[-1]['use_replica'])
+
+        # After the replica lag the namespace is read from the replica again
+        invalidateNamespace('categories')
+        Cache().setValue(getNamespaceModifiedKey('categories'), str(int(time.time()) - 60), expire=None)
+        requestView()
+        self.assertTrue(routing_states[-1]['use_replica'])
+
+
+    def testViewsAreNotAtomicOnReplica(self):
+        with mock.patch.object(project_settings, 'DB_REPLICA_HOST', 'replica.local'):
+            databases = runpy.run_module('mrstone.settings')['DATABASES']
+        self.assertIn('replica', databases)
+
+        handler = BaseHandler()
+        with mock.patch('django.core.handlers.base.connections', ConnectionHandler(databases)):
+            # Async views can't be made atomic, Django raises an error for them
+            async_view = resolve(reverse('product_list', urlconf='mrstone.async_urls'), urlconf='mrstone.async_urls').func
+            self.assertIs(handler.make_view_atomic(async_view), async_view)
+
+            # Sync views open transactions only for writes, on the primary database
+            sync_view = resolve(reverse('order_list')).func
+            self.assertIs(handler.make_view_atomic(sync_view), sync_view)
+
+
+class RateLimitMiddlewareTests(SimpleTestCase):
+    client_ip = '203.0.113.10'
+    client_cache_key = f'rate_limit:{client_ip}'
+
+    def setUp(self):
+        super().setUp()
+        self.cache = Cache()
+        self.cache.deleteKey(self.client_cache_key)
+        self.addCleanup(self.cache.deleteKey, self.client_cache_key)
+        self.now = 1_700_000_000_000
+
+
+    def makeMiddleware(self) -> RateLimitMiddleware:
+        return RateLimitMiddleware(lambda request: HttpResponse())
+
+
+    def makeRequest(self, middleware: RateLimitMiddleware, delay: int | None = None) -> int:
+        "Sends a request `delay` ms after `self.now`, or at the real time if the delay isn't set."
+
+        request = RequestFactory().get('/', REMOTE_ADDR=self.client_ip)
+        if delay is None:
+            return middleware(request).status_code
+
+        with mock.patch('mrstone.middleware.time') as time_module:
+            time_module.time.return_value = (self.now + delay) / 1000
+            return middleware(request).status_code
+
+
+    def setClientState(self, count: int) -> None:
+        self.cache.redis_client.hset(self.client_cache_key, mapping={'count': count, 'last': self.now})
+
+
+    def getClientCount(self) -> int:
+        return int(self.cache.redis_client.hget(self.client_cache_key, 'count'))
+
+
+    @override_settings(RATE_LIMIT_DELAY_LEVELS=(
+        {'limit': 50, 'delay': 0}, {'limit': 100, 'delay': 250}, {'limit': 200, 'delay': 500},
+    ))
+    def testDelayLevels(self):
+        middleware = self.makeMiddleware()
+
+        self.setClientState(49)
+        self.assertEqual(self.makeRequest(middleware, delay=0), 200)
+
+        for count in (50, 99):
+            self.setClientState(count)
+            self.assertEqual(self.makeRequest(middleware, delay=100), 429)
+            self.setClientState(count)
+            self.assertEqual(self.makeRequest(middleware, delay=300), 200)
+
+        for count in (100, 199):
+            self.setClientState(count)
+            self.assertEqual(self.makeRequest(middleware, delay=300), 429)
+            self.setClientState(count)
+            self.assertEqual(self.makeRequest(middleware, delay=600), 200)
+
+        # Above the last level requests are rejected whatever the delay is
+        for count in (200, 1000):
+            self.setClientState(count)
+            self.assertEqual(self.makeRequest(middleware, delay=60_000), 429)
+
+        # Rejected requests are counted too
+        self.assertEqual(self.getClientCount(), 1001)
+
+
+    @override_settings(RATE_LIMIT_WINDOW_SECONDS=1)
+    def testStateExpiresWithWindow(self):
+        middleware = self.makeMiddleware()
+
+        self.assertEqual(self.makeRequest(middleware), 200)
+        self.assertLessEqual(self.cache.getKeyTTL(self.client_cache_key), 1)
+
+        # The state update keeps the expiration of the window
+        self.cache.redis_client.hset(self.client_cache_key, 'count', 200)
+        self.assertEqual(self.makeRequest(middleware), 429)
+        self.assertIsNotNone(self.cache.getKeyTTL(self.client_cache_key))
+
+        time.sleep(1.1)
+        self.assertEqual(self.makeRequest(middleware), 200)
+        self.assertEqual(self.getClientCount(), 1)
+
+
+    @override_settings(RATE_LIMIT_DELAY_LEVELS=({'limit': 100_000, 'delay': 0},))
+    def testParallelRequestsAreAllCounted(self):
+        requests_count = 200
+        # More concurrent requests than connections in the pool would fail on getting a connection
+        concurrency = project_settings.CACHE_MAX_CONNECTIONS
+        middleware = self.makeMiddleware()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            statuses = list(executor.map(lambda i: self.makeRequest(middleware), range(requests_count)))
+        self.assertEqual(statuses, [200] * requests_count)
+        self.assertEqual(self.getClientCount(), requests_count)
+
+        async def getResponse(request):
+            return HttpResponse()
+
+        async def sendRequests():
+            middleware = RateLimitMiddleware(getResponse)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def sendRequest():
+                async with semaphore:
+                    response = await middleware(RequestFactory().get('/', REMOTE_ADDR=self.client_ip))
+                return response.status_code
+
+            return await asyncio.gather(*(sendRequest() for i in range(requests_count)))
+
+        self.assertEqual(asyncio.run(sendRequests()), [200] * requests_count)
+        self.assertEqual(self.getClientCount(), requests_count * 2)
+
+
+def raiseLibraryError(text: str) -> None:
+    json.loads(text)
+
+
+class AlertAggregatorTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sent_messages = []
+
+        def sendRequest(token, request_method, api_method, parameters):
+            self.sent_messages.append(parameters)
+            return {'code': 200, 'text': '{}'}
+
+        patches = [
+            mock.patch('alerts.telegram_api.sendRequest', side_effect=sendRequest),
+            mock.patch.object(project_settings, 'TELEGRAM_LOGS_BOT_USERS', [1]),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+
+    def testRepeatsAreSentAsDigest(self):
+        aggregator = AlertAggregator(window=60, max_messages_per_second=1000)
+        for i in range(3):
+            aggregator.add(makeLogRecord('error', 'Database is unavailable', send_telegram_message=True))
+        aggregator.add(makeLogRecord('error', 'Cache is unavailable', send_telegram_message=True))
+
+        # The first record of every fingerprint is sent immediately, repeats wait for the window end
+        self.assertEqual(aggregator.flush(), [])
+        self.assertEqual(len(self.sent_messages), 2)
+
+        for alert in aggregator.alerts.values():
+            alert['window_started_at'] -= 60
+        aggregator.flush()
+        self.assertEqual(len(self.sent_messages), 3)
+        self.assertIn('x2 in last 60s', self.sent_messages[-1]['text'])
+        self.assertIn('Database is unavailable', self.sent_messages[-1]['text'])
+
+        # Fingerprints without repeats in the window are forgotten
+        for alert in aggregator.alerts.values():
+            alert['window_started_at'] -= 60
+        aggregator.flush()
+        self.assertEqual(len(self.sent_messages), 3)
+        self.assertEqual(aggregator.alerts, {})
+
+
+    def testLongMessagesAreTruncated(self):
+        aggregator = AlertAggregator(max_messages_per_second=1000)
+        aggregator.add(makeLogRecord('error', 'x' * 10_000, send_telegram_message=True))
+        aggregator.flush()
+        self.assertLessEqual(len(self.sent_messages[0]['text']), MESSAGE_MAX_LENGTH + 10)
+
+
+    def testExceptionFingerprintUsesProjectFrame(self):
+        exceptions = []
+        for text in ('{', '['):
+            try:
+                raiseLibraryError(text)
+            except ValueError as e:
+                exceptions.append(e)
+
+        # Both exceptions are raised by the json module, but come from the same project line
+        fingerprint = makeExceptionFingerprint(exceptions[0])
+        self.assertEqual(fingerprint, makeExceptionFingerprint(exceptions[1]))
+        self.assertTrue(fingerprint.startswith(f'JSONDecodeError@{os.path.join("mrstone", "mrstone", "tests.py")}:'))
+
+        try:
+            json.loads('{')
+        except ValueError as e:
+            self.assertNotEqual(makeExceptionFingerprint(e), fingerprint)
+
+
+class LogWriterTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        # Log files are written relative to the working directory
+        working_directory = os.getcwd()
+        temp_directory = tempfile.TemporaryDirectory()
+        os.chdir(temp_directory.name)
+        self.addCleanup(temp_directory.cleanup)
+        self.addCleanup(os.chdir, working_directory)
+
+
+    def testRecordsAreWrittenInBackground(self):
+        writer = LogWriter(tick_interval=0.01)
+        writer.alert_aggregator = mock.Mock(flush=mock.Mock(return_value=[]))
+
+        record = makeLogRecord('error', 'Order was not saved', details='Traceback', send_telegram_message=True)
+        self.assertTrue(writer.put(record))
+        writer.put(makeLogRecord('info', 'Order was saved'))
+        writer.stop()
+        self.assertFalse(writer.thread.is_alive())
+
+        created_at = record['created_at']
+        file_path = f'logs/{created_at.year}/{created_at.month}/{created_at.day}/log-{created_at.hour}.log'
+        with open(file_path) as file:
+            content = file.read()
+        self.assertIn('Order was not saved', content)
+        self.assertIn('Order was saved', content)
+
+        # Only records marked for Telegram reach the alerts
+        writer.alert_aggregator.add.assert_called_once_with(record)
+
+
+    def testFullQueueDropsRecords(self):
+        writer = LogWriter(queue_size=1)
+        with mock.patch.object(writer, 'start'):
+            self.assertTrue(writer.put(makeLogRecord('info', 'First')))
+            self.assertFalse(writer.put(makeLogRecord('info', 'Second')))
+        self.assertEqual(writer.dropped_count, 1)
+
+        # The next batch reports the dropped records
+        batch = [writer.queue.get_nowait()]
+        writer.writeBatch(batch)
+        writer.closeFile()
+        self.assertEqual(batch[-1]['level'], 'warning')
+        self.assertIn('1 log records were dropped', batch[-1]['message'])
+        self.assertEqual(writer.dropped_count, 0)
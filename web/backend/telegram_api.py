@@ -1,6 +1,12 @@
 import requests
 
 
+# One session for all the requests keeps connections to the Telegram API alive
+session = requests.Session()
+
+REQUEST_TIMEOUT = 10
+
+
 def sendRequest(bot_token: str, request_method: str, api_method: str, parameters:dict={}) -> str:
     """
     Sends request to Telegram API.
@@ -11,14 +17,18 @@ def sendRequest(bot_token: str, request_method: str, api_method: str, parameters
     :param bot: the bot whose token will be used to send the request.
     """
 
-    request = f'''
-        https://api.telegram.org/bot{bot_token}/{api_method}?{'&'.join([f'{k}={v}' for k, v in parameters.items()])}
-    '''
+    request = f'https://api.telegram.org/bot{bot_token}/{api_method}'
 
-    if request_method == 'GET':
-        r = requests.get(request)
-    elif request_method == 'POST':
-        r = requests.post(request)
+    try:
+        if request_method == 'GET':
+            r = session.get(request, params=parameters, timeout=REQUEST_TIMEOUT)
+        elif request_method == 'POST':
+            r = session.post(request, json=parameters, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        return {
+            'code': None,
+            'text': str(e),
+        }
 
     response = {
         'code': r.status_code,
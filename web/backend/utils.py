@@ -1,10 +1,13 @@
-from django.http.request import HttpRequest, QueryDict
-from django.utils import timezone
+from django.http.request import HttpRequest
+from django.db.models import Q, QuerySet
 
 from typing import Any
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+import json
+import base64
+
 
 def makeResponseData(status: int, message: str = None, details: Any = None) -> dict:
     response_data = {
@@ -15,31 +18,112 @@ def makeResponseData(status: int, message: str = None, details: Any = None) -> d
     return response_data
 
 
-def makeModelFilterKwargs(filters: tuple, query_params: QueryDict) -> dict:
-    "Compiles a dictionary of kwargs for their application in the model filter."
+def encodeCursor(cursor: dict) -> str:
+    "Packs the pagination cursor into an opaque url-safe string."
+
+    cursor_json = json.dumps(cursor, default=str)
+    return base64.urlsafe_b64encode(cursor_json.encode('utf-8')).decode('utf-8').rstrip('=')
+
+
+def decodeCursor(cursor_string: str) -> dict:
+    "Unpacks the pagination cursor, raises `ValueError` if the string is not a valid cursor."
+
+    padding = '=' * (-len(cursor_string) % 4)
+    cursor = json.loads(base64.urlsafe_b64decode(cursor_string + padding))
+
+    if not isinstance(cursor, dict) or not isinstance(cursor.get('values'), list):
+        raise ValueError('Cursor must contain a list of values')
+
+    # Lists and objects can't be compared with field values, Django raises `TypeError` on them
+    if any(isinstance(value, (list, dict)) for value in cursor['values']):
+        raise ValueError('Cursor values must be strings, numbers or null')
+
+    return cursor
+
+
+def makeKeysetCondition(ordering: tuple, values: list, reverse: bool = False) -> Q:
+    "Compiles a condition which selects objects placed after the given values of the ordering fields."
+
+    if len(ordering) != len(values):
+        raise ValueError('Cursor values do not match the ordering')
+
+    fields = [field.lstrip('-') for field in ordering]
+    lookups = ['lt' if field.startswith('-') != reverse else 'gt' for field in ordering]
+
+    condition = Q()
+    for i in range(len(fields)):
+        field_condition = Q(**{f'{fields[i]}__{lookups[i]}': values[i]})
+        for field, value in zip(fields[:i], values[:i]):
+            field_condition &= Q(**{field: value})
+        condition |= field_condition
+
+    # Redundant bound on the first field lets the database use an index range scan
+    first_lookup = f'{fields[0]}__{lookups[0]}e'
+    return Q(**{first_lookup: values[0]}) & condition
+
+
+def makeCursorPageQuerySet(queryset: QuerySet, ordering: tuple, cursor: dict | None, limit: int) -> QuerySet:
+    "Returns the queryset of the cursor page with one extra object which tells whether there are more pages."
+
+    if cursor and cursor.get('ordering', list(ordering)) != list(ordering):
+        raise ValueError('Cursor was made for another ordering')
+
+    reverse = bool(cursor and cursor.get('reverse'))
+    if cursor:
+        queryset = queryset.filter(makeKeysetCondition(ordering, cursor['values'], reverse))
+
+    if reverse:
+        ordering_fields = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+    else:
+        ordering_fields = list(ordering)
+
+    return queryset.order_by(*ordering_fields)[:limit + 1]
+
+
+def makeCursorPage(objects: list, ordering: tuple, cursor: dict | None, limit: int) -> tuple[list, str | None, str | None]:
+    "Cuts the objects fetched by `makeCursorPageQuerySet` to the page and makes cursors of the neighbour pages."
+
+    reverse = bool(cursor and cursor.get('reverse'))
+    has_more = len(objects) > limit
+    objects = objects[:limit]
+    if reverse:
+        objects.reverse()
+
+    next_cursor = prev_cursor = None
+    if objects:
+        def getValues(obj) -> list:
+            return [getattr(obj, field.lstrip('-')) for field in ordering]
+
+        # A backward page always has the page it was reached from after it
+        if has_more or reverse:
+            next_cursor = encodeCursor({'values': getValues(objects[-1]), 'ordering': ordering})
+        if (has_more and reverse) or (cursor and not reverse):
+            prev_cursor = encodeCursor({'values': getValues(objects[0]), 'ordering': ordering, 'reverse': True})
+
+    return objects, next_cursor, prev_cursor
+
 
-    filter_kwargs = {}
+def paginateByCursor(queryset: QuerySet, ordering: tuple, cursor: dict | None, limit: int) -> tuple[list, str | None, str | None]:
+    """
+    Selects a page of objects following the cursor instead of using SQL OFFSET,
+    so deep pages are as cheap as the first one.
+    Returns page objects and encoded cursors of the next and previous pages.
 
-    for field in filters:
-        value = query_params.get(field)
-        if value:
-            if field.endswith('_at') and ':' in value:
-                date_from_str, date_to_str = value.split(':')
+    :param queryset: filtered queryset.
+    :param ordering: fields of the page ordering, the last one must be unique (e.g. `id`).
+    :param cursor: decoded cursor of the required page or `None` for the first page.
+    :param limit: page size.
+    """
 
-                try:
-                    date_from = timezone.make_aware(datetime.strptime(date_from_str, '%Y-%m-%d'))
-                    date_to = timezone.make_aware(datetime.strptime(date_to_str, '%Y-%m-%d'))
-                except ValueError:
-                    continue
+    objects = list(makeCursorPageQuerySet(queryset, ordering, cursor, limit))
+    return makeCursorPage(objects, ordering, cursor, limit)
 
-                date_from = date_from.replace(hour=0, minute=0, second=0)
-                date_to = date_to.replace(hour=23, minute=59, second=59)
 
-                filter_kwargs[f"{field}__range"] = [date_from, date_to]
-            else:
-                filter_kwargs[field] = value
+async def paginateByCursorAsync(queryset: QuerySet, ordering: tuple, cursor: dict | None, limit: int) -> tuple[list, str | None, str | None]:
+    "Async version of `paginateByCursor` for async views."
 
-    return filter_kwargs
+    objects = [obj async for obj in makeCursorPageQuerySet(queryset, ordering, cursor, limit)]
+    return makeCursorPage(objects, ordering, cursor, limit)
 
 
 def getCurrentDateTime(timezone_code: str = 'UTC', exclude_timezone: bool = False) -> datetime: